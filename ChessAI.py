@@ -1,17 +1,95 @@
+import multiprocessing
 import random
+import time
 from ChessEngine import *
 from EvaluateState import *
+from TranspositionTable import *
+from OpeningBook import OpeningBook
+from Tablebase import Tablebase
+from Perft import perft, parallelPerft
 
 fen = Fen()
 
 boardEval = Evaluate()
-DEPTH = 2
+DEPTH = 3
+INFINITY = 100000
+MAX_PLY = 64
+
+# scores above this are mates, they are stored in the transposition table relative to the node instead of the root
+MATE_BOUND = CHECKMATE - 1000
+
+# move ordering: hash move, then captures (MVV-LVA), then killer moves, then quiet moves by history
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 29
+KILLER_SCORE = 1 << 28
+
+# quiescence search: a capture is skipped if even winning the captured piece and this much more (two pawns) can not
+# raise alpha (delta pruning)
+DELTA_MARGIN = 20
+
+# how many nodes are searched between checks of the clock
+BUDGET_CHECK_INTERVAL = 256
+
+# parallel search modes: split the root moves between the workers, or have every worker search the whole position
+# sharing one transposition table (lazy SMP)
+ROOT_SPLIT = "root"
+LAZY_SMP = "smp"
+
+# lazy SMP helper workers (every worker but the first) skip iteration d when (d + phase) // size is odd, each helper
+# with its own (size, phase) so they spread over the depths instead of repeating each other's searches
+SKIP_SIZES = (1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3, 4, 4, 4, 4, 4, 4, 4, 4)
+SKIP_PHASES = (0, 1, 0, 1, 2, 3, 0, 1, 2, 3, 4, 5, 0, 1, 2, 3, 4, 5, 6, 7)
+
+
+""" 
+Raised inside the search when the time or node budget runs out
+"""
+
+
+class SearchTimeout(Exception):
+    pass
 
 
 class AI():
-    def __init__(self, gs):
+    """
+        depth is the deepest iteration searched. timeLimit (seconds) and nodeLimit cap each search, with a budget
+        the search deepens until it runs out unless a depth is also given.
+        workers above 1 searches in that many worker processes, parallel picks how the work is shared (ROOT_SPLIT or LAZY_SMP)
+        book is a Polyglot .bin opening book to play from before searching
+        tablebase is a directory of endgame tables written by Tablebase.py, probed instead of searching positions with
+        few enough pieces
+    """
+
+    def __init__(self, gs, ttSizeMB=16, ttReplacement=DEPTH_PREFERRED, depth=DEPTH, timeLimit=None, nodeLimit=None, workers=1,
+                 parallel=ROOT_SPLIT, book=None, tablebase=None):
+        if parallel not in (ROOT_SPLIT, LAZY_SMP):
+            raise ValueError("Unknown parallel search mode: " + str(parallel))
         self.piece = Piece()
         self.gs = gs
+        self.depth = depth
+        self.timeLimit = timeLimit
+        self.nodeLimit = nodeLimit
+        self.ttSizeMB = ttSizeMB
+        self.ttReplacement = ttReplacement
+        self.tt = TranspositionTable(ttSizeMB, ttReplacement)
+        self.workers = workers
+        self.parallel = parallel
+        self.pool = None
+        # the table shared with the worker processes in lazy SMP mode
+        self.sharedTT = None
+        self.nodes = 0
+        self.completedDepth = 0
+        self.bestScore = 0
+        self.rootBestMoveCode = 0
+        # (depth, score, moveCode) for each completed iteration of the last search
+        self.iterations = []
+        self.searchNodeLimit = None
+        self.deadline = None
+        self.nextBudgetCheck = INFINITY
+        self.clearMoveOrdering()
+        self.book = OpeningBook(book) if book is not None else None
+        self.tablebaseDirectory = tablebase
+        self.tablebase = Tablebase(tablebase) if tablebase is not None else None
 
     """ 
     Returns a random move from the list of valid moves
@@ -21,63 +99,518 @@ class AI():
         return random.choice(validMoves)
 
     """ 
-    Makes the best move using whichever algorithm is chosen
+    Makes the best move using iterative deepening: searches depth 1, 2, 3... until the depth, time or node budget is
+    used up and returns the best move of the last completed iteration. startDepth skips the shallower iterations.
+    Positions in the opening book are played from the book and positions in the endgame tablebase from the tablebase,
+    without a search. probeRoot False always searches, for the worker processes whose parent has tried both already.
+    skipPattern is a lazy SMP helper's (size, phase), see SKIP_SIZES
     """
 
-    def findBestMove(self, gs, validMoves):
-        global bestMove
-        bestMove = 0
-        self.minmax(gs, validMoves, 2, self.gs.whiteToMove)
+    def findBestMove(self, gs, validMoves, depth=None, timeLimit=None, nodeLimit=None, startDepth=1, probeRoot=True,
+                     skipPattern=None):
+        depth = depth if depth is not None else self.depth
+        timeLimit = timeLimit if timeLimit is not None else self.timeLimit
+        nodeLimit = nodeLimit if nodeLimit is not None else self.nodeLimit
+        hasBudget = timeLimit is not None or nodeLimit is not None
+        if depth is None:
+            depth = MAX_PLY - 1 if hasBudget else DEPTH
+
+        if probeRoot and self.book is not None:
+            bookMove = self.book.pickMove(gs, validMoves)
+            if bookMove is not None:
+                self.nodes = 0
+                self.completedDepth = 0
+                self.iterations = []
+                return bookMove
+
+        if probeRoot and self.tablebase is not None:
+            result = self.tablebase.bestMove(gs, validMoves)
+            if result is not None:
+                move, self.bestScore = result
+                self.nodes = 0
+                self.completedDepth = 0
+                self.iterations = []
+                return move
+
+        if self.workers > 1 and len(validMoves) > 1:
+            if self.parallel == LAZY_SMP:
+                return self.findBestMoveLazySMP(gs, validMoves, depth, timeLimit, nodeLimit)
+            return self.findBestMoveParallel(gs, validMoves, depth, timeLimit, nodeLimit)
+
+        self.clearMoveOrdering()
+        self.nodes = 0
+        self.completedDepth = 0
+        self.rootBestMoveCode = 0
+        self.iterations = []
+        self.searchNodeLimit = nodeLimit
+        self.deadline = time.time() + timeLimit if timeLimit is not None else None
+        # the first iteration always completes so there is a move to return
+        self.nextBudgetCheck = INFINITY
+        moveLogLength = len(gs.moveLog)
+
+        bestMove = None
+        for iterationDepth in range(min(startDepth, depth), depth + 1):
+            # the first iteration and the last are never skipped
+            if skipPattern is not None and self.iterations and iterationDepth < depth:
+                size, phase = skipPattern
+                if (iterationDepth + phase) // size % 2:
+                    continue
+            try:
+                score, move = self.negamax(gs, iterationDepth, 0, -INFINITY, INFINITY, validMoves)
+            except SearchTimeout:
+                # unwind the moves made by the interrupted iteration
+                while len(gs.moveLog) > moveLogLength:
+                    gs.undoMove()
+                break
+
+            bestMove = move
+            self.bestScore = score
+            self.completedDepth = iterationDepth
+            self.rootBestMoveCode = encodeMove(move)
+            self.iterations.append((iterationDepth, score, self.rootBestMoveCode))
+            if move is None or abs(score) > MATE_BOUND:
+                break
+            if hasBudget:
+                self.nextBudgetCheck = self.nodes + 1
+
         return bestMove
 
-    """ 
-    Returns the best move from the list of valid moves using minmax algo without alpha beta pruning
+    """
+    Splits the root moves between the worker processes, each one rebuilds the game from its starting FEN and move log
+    and runs the iterative deepening search on its share. The results are compared at the deepest iteration every
+    worker completed, the node budget is shared out between the workers
     """
 
-    def minmax(self, gs, validMoves, depth, whiteToMove):
-        global bestMove
-        if depth == 0:
-            return boardEval.evaluatePieceValues(gs)
-
-        if whiteToMove:
-            maxScore = -9999
-            for move in validMoves:
-                gs.makeMove(move)
-                score = self.minmax(gs, gs.getLegalMoves(), depth - 1, False)
-                gs.undoMove()
-                if score > maxScore:
-                    maxScore = score
-                    if depth == DEPTH:
-                        bestMove = move
-            return maxScore
+    def findBestMoveParallel(self, gs, validMoves, depth, timeLimit, nodeLimit):
+        self.clearMoveOrdering()
+        # the last best move is from the previous search's position
+        self.rootBestMoveCode = 0
+        numTasks = min(self.workers, len(validMoves))
+        # deal the ordered moves out in turn so each worker gets some of the promising ones
+        orderedMoves = self.orderMoves(validMoves, 0, 0)
+        moveLogIDs = [move.moveID for move in gs.moveLog]
+        workerNodeLimit = max(1, nodeLimit // numTasks) if nodeLimit is not None else None
+        tasks = []
+        for i in range(numTasks):
+            rootMoveIDs = [move.moveID for move in orderedMoves[i::numTasks]]
+            tasks.append((gs.fenString, moveLogIDs, gs.bitboards is not None, rootMoveIDs, depth, timeLimit, workerNodeLimit, 1,
+                          None))
 
+        results = self.getPool().map(searchRootMoves, tasks)
+
+        self.nodes = sum(nodes for iterations, nodes in results)
+        # a worker with no iterations did not search and has nothing to compare
+        results = [(iterations, nodes) for iterations, nodes in results if iterations]
+        if not results:
+            self.completedDepth = 0
+            self.iterations = []
+            return validMoves[0]
+        # a worker that stopped early on a mate score keeps that score at every deeper iteration
+        finished = [iterations for iterations, nodes in results if abs(iterations[-1][1]) > MATE_BOUND]
+        searching = [iterations for iterations, nodes in results if abs(iterations[-1][1]) <= MATE_BOUND]
+        if searching:
+            commonDepth = min(iterations[-1][0] for iterations in searching)
         else:
-            minScore = 9999
-            for move in validMoves:
-                gs.makeMove(move)
-                score = self.minmax(gs, gs.getLegalMoves(), depth - 1, True)
-                gs.undoMove()
-                if score < minScore:
-                    minScore = score
-                    if depth == DEPTH:
-                        bestMove = move
-            return minScore
-
-    """  
-        Tests the amount of moves being generated at a certain depth for a given state
-    """
-
-    def testMoveGeneration(self, depth):
+            commonDepth = max(iterations[-1][0] for iterations in finished)
+
+        self.bestScore = -INFINITY
+        self.rootBestMoveCode = 0
+        for iterations in finished + searching:
+            iterationDepth, score, moveCode = iterations[min(commonDepth, len(iterations)) - 1]
+            if score > self.bestScore:
+                self.bestScore = score
+                self.rootBestMoveCode = moveCode
+        self.completedDepth = commonDepth
+        self.iterations = [(commonDepth, self.bestScore, self.rootBestMoveCode)]
+        return findMove(validMoves, self.rootBestMoveCode)
+
+    """
+    Lazy SMP: every worker searches the whole position with iterative deepening and they share one transposition
+    table in shared memory, so the entries one worker stores cut off the others' searches. The helper workers skip
+    iterations in a different pattern each (SKIP_SIZES and SKIP_PHASES) so they do not all search the same depth at
+    once. The move played comes from the worker that completed the deepest iteration, the first worker on a tie
+    """
+
+    def findBestMoveLazySMP(self, gs, validMoves, depth, timeLimit, nodeLimit):
+        moveLogIDs = [move.moveID for move in gs.moveLog]
+        rootMoveIDs = [move.moveID for move in validMoves]
+        workerNodeLimit = max(1, nodeLimit // self.workers) if nodeLimit is not None else None
+        tasks = []
+        for i in range(self.workers):
+            skipPattern = (SKIP_SIZES[(i - 1) % len(SKIP_SIZES)], SKIP_PHASES[(i - 1) % len(SKIP_PHASES)]) if i else None
+            tasks.append((gs.fenString, moveLogIDs, gs.bitboards is not None, rootMoveIDs, depth, timeLimit, workerNodeLimit, 1,
+                          skipPattern))
+
+        results = self.getPool().map(searchRootMoves, tasks)
+
+        self.nodes = sum(nodes for iterations, nodes in results)
+        results = [(iterations, nodes) for iterations, nodes in results if iterations]
+        if not results:
+            self.completedDepth = 0
+            self.iterations = []
+            return validMoves[0]
+        deepest = max(results, key=lambda result: result[0][-1][0])[0]
+        self.completedDepth, self.bestScore, self.rootBestMoveCode = deepest[-1]
+        self.iterations = deepest
+        return findMove(validMoves, self.rootBestMoveCode)
+
+    """
+    The worker processes are started on the first parallel search and kept for the next ones. In lazy SMP mode they
+    attach to a transposition table in shared memory, which is also kept so later moves start from its entries
+    """
+
+    def getPool(self):
+        if self.pool is None:
+            sharedName = None
+            if self.parallel == LAZY_SMP:
+                self.sharedTT = TranspositionTable(self.ttSizeMB, self.ttReplacement, shared=True)
+                sharedName = self.sharedTT.sharedName
+            self.pool = multiprocessing.Pool(self.workers, initializer=initWorker,
+                                             initargs=(self.ttSizeMB, self.ttReplacement, sharedName,
+                                                       self.tablebaseDirectory))
+        return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        if self.sharedTT is not None:
+            self.sharedTT.close(unlink=True)
+            self.sharedTT = None
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+
+    """
+    Raises SearchTimeout once the node or time budget is used up
+    """
+
+    def checkBudget(self):
+        if self.searchNodeLimit is not None and self.nodes >= self.searchNodeLimit:
+            raise SearchTimeout()
+        if self.deadline is not None and time.time() >= self.deadline:
+            raise SearchTimeout()
+        self.nextBudgetCheck = self.nodes + BUDGET_CHECK_INTERVAL
+        if self.searchNodeLimit is not None:
+            self.nextBudgetCheck = min(self.nextBudgetCheck, self.searchNodeLimit)
+
+    """
+    Resets the killer moves and history heuristic between searches
+    """
+
+    def clearMoveOrdering(self):
+        # two killer moves (packed) per ply
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        # history[pieceMoved][endSquare]
+        self.history = [[0] * 64 for _ in range(24)]
+
+    """
+    Negamax search with alpha beta pruning. Scores are from the point of view of the side to move.
+    Returns (score, bestMove), bestMove is None when the score comes from the transposition table or the tablebase or
+    the node is a leaf.
+    validMoves restricts the moves searched at this node, by default all legal moves are searched and they are
+    generated in stages by pickMoves
+    """
+
+    def negamax(self, gs, depth, ply, alpha, beta, validMoves=None):
+        self.nodes += 1
+        if self.nodes >= self.nextBudgetCheck:
+            self.checkBudget()
+        if self.tablebase is not None and ply > 0:
+            tablebaseScore = self.tablebase.probe(gs)
+            if tablebaseScore is not None:
+                # the tablebase's mate scores count from this node
+                return scoreFromTT(tablebaseScore, ply), None
+        alphaOrig = alpha
+        key = gs.zobristKey
+        # at the root the previous iteration's best move goes first
+        hashMoveCode = self.rootBestMoveCode if ply == 0 else 0
+        entry = self.tt.probe(key)
+        if entry is not None:
+            entryDepth, entryScore, bound, entryMoveCode = entry
+            if entryMoveCode and not hashMoveCode:
+                hashMoveCode = entryMoveCode
+            # the root is always searched so a best move is returned
+            if ply > 0 and entryDepth >= depth:
+                entryScore = scoreFromTT(entryScore, ply)
+                if bound == EXACT:
+                    return entryScore, None
+                elif bound == LOWER_BOUND:
+                    alpha = max(alpha, entryScore)
+                else:
+                    beta = min(beta, entryScore)
+                if alpha >= beta:
+                    return entryScore, None
+
         if depth == 0:
-            return 1
+            return self.quiescence(gs, ply, alpha, beta), None
 
-        validMoves = gs.getLegalMoves()
+        if validMoves is None:
+            moves = self.pickMoves(gs, hashMoveCode, ply)
+        else:
+            moves = self.orderMoves(validMoves, hashMoveCode, ply)
+
+        bestScore = -INFINITY
+        bestMove = None
+        for move in moves:
+            gs.makeMove(move)
+            score = -self.negamax(gs, depth - 1, ply + 1, -beta, -alpha)[0]
+            gs.undoMove()
+            if score > bestScore:
+                bestScore = score
+                bestMove = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if self.isQuiet(move):
+                    self.storeKiller(move, ply)
+                    self.history[move.pieceMoved][move.endRow * 8 + move.endCol] += depth * depth
+                break
+
+        if bestMove is None:
+            # no legal moves, prefer the quickest mate
+            if gs.inCheck:
+                return -CHECKMATE + ply, None
+            return 0, None
 
-        numPositions = 0
+        if bestScore <= alphaOrig:
+            bound = UPPER_BOUND
+        elif bestScore >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.tt.store(key, depth, scoreToTT(bestScore, ply), bound, encodeMove(bestMove))
+        return bestScore, bestMove
 
+    """
+    Searches captures and promotions only until the position is quiet, so the evaluation at the end of the main search
+    is never taken in the middle of an exchange. The side to move may stand pat on the static evaluation, except in check
+    where every evasion is searched. Captures that can not raise alpha even with a margin (delta pruning) or that lose
+    material to a recapture are skipped
+    """
+
+    def quiescence(self, gs, ply, alpha, beta):
+        self.nodes += 1
+        if self.nodes >= self.nextBudgetCheck:
+            self.checkBudget()
+
+        inCheck = gs.kingInCheck()
+        if inCheck:
+            moves = self.orderMoves(gs.getLegalMoves(), 0, ply)
+            if len(moves) == 0:
+                return -CHECKMATE + ply
+            standPat = bestScore = -INFINITY
+        else:
+            standPat = bestScore = self.evaluate(gs)
+            if standPat >= beta or ply >= MAX_PLY:
+                return standPat
+            # not even winning a queen would raise alpha
+            if standPat + boardEval.pieceEval[QUEEN] + DELTA_MARGIN <= alpha:
+                return standPat
+            alpha = max(alpha, standPat)
+            moves = gs.getCaptureMoves(promotions=True)
+            moves.sort(key=self.noisyScore, reverse=True)
+
+        for move in moves:
+            if not inCheck:
+                if standPat + self.materialGain(move) + DELTA_MARGIN <= alpha:
+                    continue
+                if self.losesMaterial(gs, move):
+                    continue
+            gs.makeMove(move)
+            score = -self.quiescence(gs, ply + 1, -beta, -alpha)
+            gs.undoMove()
+            if score > bestScore:
+                bestScore = score
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+
+        return bestScore
+
+    """
+    Material won by a capture or promotion, before any recapture
+    """
+
+    def materialGain(self, move):
+        pieceEval = boardEval.pieceEval
+        gain = pieceEval[PAWN] if move.isEnpassantMove else pieceEval[move.pieceCaptured & TYPE_MASK]
+        if move.pawnPromotion:
+            gain += pieceEval[move.promotionChoice] - pieceEval[PAWN]
+        return gain
+
+    """
+    A capture or promotion loses material if the static exchange on its end square does. Taking a piece worth at least
+    as much as the capturing one can not lose material, so those captures skip the exchange
+    """
+
+    def losesMaterial(self, gs, move):
+        pieceEval = boardEval.pieceEval
+        if move.isEnpassantMove:
+            return False
+        if not move.pawnPromotion and \
+                pieceEval[move.pieceMoved & TYPE_MASK] <= pieceEval[move.pieceCaptured & TYPE_MASK]:
+            return False
+        return gs.see(move) < 0
+
+    """
+    Static evaluation from the point of view of the side to move
+    """
+
+    def evaluate(self, gs):
+        evaluation = boardEval.evaluatePosition(gs)
+        return evaluation if gs.whiteToMove else -evaluation
+
+    def isQuiet(self, move):
+        return move.pieceCaptured == 0 and not move.isEnpassantMove and not move.pawnPromotion
+
+    def storeKiller(self, move, ply):
+        moveCode = encodeMove(move)
+        killers = self.killers[ply]
+        if killers[0] != moveCode:
+            killers[1] = killers[0]
+            killers[0] = moveCode
+
+    """
+    Sorts the moves so the most promising are searched first: the hash move, captures by most valuable victim and
+    least valuable attacker, killer moves, then the remaining quiet moves by their history score
+    """
+
+    def orderMoves(self, validMoves, hashMoveCode, ply):
+        killers = self.killers[ply] if ply < MAX_PLY else (0, 0)
+        scores = []
         for move in validMoves:
-            self.gs.makeMove(move)
-            numPositions += self.testMoveGeneration(depth - 1)
-            self.gs.undoMove()
+            moveCode = encodeMove(move)
+            if moveCode == hashMoveCode:
+                score = HASH_MOVE_SCORE
+            elif not self.isQuiet(move):
+                score = CAPTURE_SCORE + self.noisyScore(move)
+            elif moveCode == killers[0] or moveCode == killers[1]:
+                score = KILLER_SCORE
+            else:
+                score = self.history[move.pieceMoved][move.endRow * 8 + move.endCol]
+            scores.append(score)
+
+        order = sorted(range(len(validMoves)), key=scores.__getitem__, reverse=True)
+        return [validMoves[i] for i in order]
+
+    """
+    Most valuable victim, least valuable attacker score for captures, promotions add the value of the new piece
+    """
+
+    def noisyScore(self, move):
+        pieceEval = boardEval.pieceEval
+        victim = PAWN if move.isEnpassantMove else move.pieceCaptured & TYPE_MASK
+        score = 10 * pieceEval[victim] - pieceEval[move.pieceMoved & TYPE_MASK]
+        if move.pawnPromotion:
+            score += pieceEval[move.promotionChoice]
+        return score
+
+    """
+    Hands out the legal moves in much the same order as orderMoves, but generates them in stages so a node that cuts off
+    early never generates the rest: the hash move, captures by MVV-LVA, the killer moves, then the quiet moves by
+    history (promotions first). The hash and killer moves come from another position, so they are only played if
+    generating the moves between their squares shows they are legal here.
+    Captures that lose material by static exchange evaluation are held back until after the quiet moves
+    """
+
+    def pickMoves(self, gs, hashMoveCode, ply):
+        if hashMoveCode:
+            hashMove = findMove(gs.getLegalMovesBetween(hashMoveCode & 63, (hashMoveCode >> 6) & 63), hashMoveCode)
+            if hashMove is not None:
+                yield hashMove
+            else:
+                hashMoveCode = 0
+
+        captures = gs.getCaptureMoves()
+        captures.sort(key=self.noisyScore, reverse=True)
+        losingCaptures = []
+        for move in captures:
+            if move.moveID != hashMoveCode:
+                if self.losesMaterial(gs, move):
+                    losingCaptures.append(move)
+                else:
+                    yield move
+
+        killers = tuple(self.killers[ply]) if ply < MAX_PLY else (0, 0)
+        for killerCode in killers:
+            if killerCode and killerCode != hashMoveCode:
+                killer = findMove(gs.getLegalMovesBetween(killerCode & 63, (killerCode >> 6) & 63), killerCode)
+                if killer is not None and self.isQuiet(killer):
+                    yield killer
+
+        history = self.history
+        quiets = gs.getQuietMoves()
+        quiets.sort(key=lambda move: CAPTURE_SCORE + self.noisyScore(move) if move.pawnPromotion
+                    else history[move.pieceMoved][move.endRow * 8 + move.endCol], reverse=True)
+        for move in quiets:
+            moveCode = move.moveID
+            if moveCode != hashMoveCode and moveCode != killers[0] and moveCode != killers[1]:
+                yield move
+
+        yield from losingCaptures
+
+    """
+        Tests the amount of moves being generated at a certain depth for the AI's game state. workers above 1 counts
+        the subtrees in that many processes, split at the root moves or at the replies to them (splitDepth 2)
+    """
+
+    def testMoveGeneration(self, depth, workers=1, splitDepth=1):
+        if workers > 1:
+            return parallelPerft(self.gs, depth, workers=workers, splitDepth=splitDepth)
+        return perft(self.gs, depth)
+
+
+"""
+    The search run by each worker process, set up once per process by initWorker so its transposition table is kept
+    between searches
+"""
+
+workerAI = None
+
+
+def initWorker(ttSizeMB, ttReplacement, sharedName=None, tablebase=None):
+    global workerAI
+    workerAI = AI(None, ttSizeMB, ttReplacement, tablebase=tablebase)
+    if sharedName is not None:
+        workerAI.tt = TranspositionTable(ttSizeMB, ttReplacement, sharedName=sharedName)
+
+
+"""
+    Rebuilds the game and searches the given root moves starting at iteration startDepth, skipping the iterations
+    skipPattern says to, returns (iterations, nodes) for the parent to merge
+"""
+
+
+def searchRootMoves(task):
+    fenString, moveLogIDs, useBitboards, rootMoveIDs, depth, timeLimit, nodeLimit, startDepth, skipPattern = task
+    gs = GameState(fen, useBitboards, fenString)
+    gs.playMoveIDs(moveLogIDs)
+    validMoves = gs.getLegalMoves()
+    rootMoves = [move for move in validMoves if move.moveID in rootMoveIDs]
+    workerAI.gs = gs
+    workerAI.findBestMove(gs, rootMoves, depth, timeLimit, nodeLimit, startDepth, probeRoot=False, skipPattern=skipPattern)
+    return workerAI.iterations, workerAI.nodes
+
+
+"""
+    Mate scores are stored relative to the node so they stay correct when the position is reached at a different ply
+"""
+
+
+def scoreToTT(score, ply):
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
 
-        return numPositions
+def scoreFromTT(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
@@ -0,0 +1,384 @@
+"""
+Bitboard representation of the board. Each set is a 64 bit integer where bit (row * 8 + col) matches GameState.board[row][col], so square 0 is a8 and square 63 is h1.
+"""
+
+from itertools import chain
+
+FULL = 0xFFFFFFFFFFFFFFFF
+FILE_A = 0x0101010101010101
+FILE_B = FILE_A << 1
+FILE_G = FILE_A << 6
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+NOT_FILE_AB = FULL ^ (FILE_A | FILE_B)
+NOT_FILE_GH = FULL ^ (FILE_G | FILE_H)
+# row 0 is the eighth rank
+RANK_8 = 0xFF
+RANK_7 = RANK_8 << 8
+RANK_2 = RANK_8 << 48
+RANK_1 = RANK_8 << 56
+
+# (row, col) steps in the same order as GameState.getAllPinsAndChecks, the first four are orthogonal
+DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1),
+              (-1, -1), (-1, 1), (1, -1), (1, 1))
+
+# bit shift and wrap mask for a single step in each direction
+DIRECTION_SHIFTS = {
+    direction: (direction[0] * 8 + direction[1],
+                NOT_FILE_A if direction[1] == 1 else NOT_FILE_H if direction[1] == -1 else FULL)
+    for direction in DIRECTIONS
+}
+
+
+"""
+    Returns the index of the lowest set bit
+"""
+
+
+def bitScan(bb):
+    return (bb & -bb).bit_length() - 1
+
+
+"""
+    Yields the index of every set bit, lowest first
+"""
+
+
+def iterBits(bb):
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+def popCount(bb):
+    return bin(bb).count("1")
+
+
+"""
+    Set-wise attacks for every knight in the set
+"""
+
+
+def knightAttacks(bb):
+    l1 = (bb >> 1) & NOT_FILE_H
+    l2 = (bb >> 2) & NOT_FILE_GH
+    r1 = (bb << 1) & NOT_FILE_A
+    r2 = (bb << 2) & NOT_FILE_AB
+    h1 = l1 | r1
+    h2 = l2 | r2
+    return ((h1 << 16) | (h1 >> 16) | (h2 << 8) | (h2 >> 8)) & FULL
+
+
+"""
+    Set-wise attacks for every king in the set
+"""
+
+
+def kingAttacks(bb):
+    attacks = ((bb << 1) & NOT_FILE_A) | ((bb >> 1) & NOT_FILE_H)
+    bb |= attacks
+    return (attacks | (bb << 8) | (bb >> 8)) & FULL
+
+
+"""
+    Set-wise capture squares for every pawn in the set, white pawns move towards row 0
+"""
+
+
+def pawnAttacks(bb, white):
+    if white:
+        return ((bb >> 7) & NOT_FILE_A) | ((bb >> 9) & NOT_FILE_H)
+    return ((bb << 9) & NOT_FILE_A & FULL) | ((bb << 7) & NOT_FILE_H & FULL)
+
+
+"""
+    Precomputed attack tables, indexed by square. The *_ATTACKS tables hold bit sets for the bitboard backend and the
+    *_TARGETS tables hold the same squares as (row, col) tuples for the board backend. Pawn tables are indexed by
+    whether the pawn is white first, so PAWN_ATTACKS[True][sq] are the squares a white pawn on sq captures on
+"""
+
+KNIGHT_ATTACKS = [knightAttacks(1 << sq) for sq in range(64)]
+KING_ATTACKS = [kingAttacks(1 << sq) for sq in range(64)]
+PAWN_ATTACKS = ([pawnAttacks(1 << sq, False) for sq in range(64)],
+                [pawnAttacks(1 << sq, True) for sq in range(64)])
+
+
+def _targetSquares(attacks):
+    return [tuple(divmod(endSq, 8) for endSq in iterBits(bb)) for bb in attacks]
+
+
+KNIGHT_TARGETS = _targetSquares(KNIGHT_ATTACKS)
+KING_TARGETS = _targetSquares(KING_ATTACKS)
+PAWN_CAPTURE_TARGETS = (_targetSquares(PAWN_ATTACKS[False]),
+                        _targetSquares(PAWN_ATTACKS[True]))
+
+# the squares two files either side of sq on its rank, where a king castling from sq lands
+CASTLE_TARGETS = [sum(1 << (sq + step) for step in (-2, 2) if 0 <= sq % 8 + step < 8) for sq in range(64)]
+
+
+"""
+    Floods every slider in the set along one direction until it hits a piece (Kogge-Stone occluded fill). The blocking square is included in the attack set
+"""
+
+
+def rayAttacks(bb, occupied, direction):
+    amount, mask = DIRECTION_SHIFTS[direction]
+    empty = (FULL ^ occupied) & mask
+    if amount > 0:
+        bb |= empty & (bb << amount)
+        empty &= empty << amount
+        bb |= empty & (bb << 2 * amount)
+        empty &= empty << 2 * amount
+        bb |= empty & (bb << 4 * amount)
+        return (bb << amount) & mask & FULL
+    amount = -amount
+    bb |= empty & (bb >> amount)
+    empty &= empty >> amount
+    bb |= empty & (bb >> 2 * amount)
+    empty &= empty >> 2 * amount
+    bb |= empty & (bb >> 4 * amount)
+    return (bb >> amount) & mask
+
+
+"""
+    Precomputed sliding piece rays. RAYS[j][sq] is every square reached from sq along DIRECTIONS[j] on an empty board and
+    RAY_TARGETS[sq][j] is the same ray as (row, col) tuples ordered outwards from sq. A slider's attacks along a ray are
+    the ray with everything behind its first blocker removed, which only needs the ray table of that blocker
+"""
+
+RAYS = [[rayAttacks(1 << sq, 0, direction) for sq in range(64)] for direction in DIRECTIONS]
+
+
+def _raySquares(sq, direction):
+    r, c = divmod(sq, 8)
+    squares = []
+    r, c = r + direction[0], c + direction[1]
+    while 0 <= r < 8 and 0 <= c < 8:
+        squares.append((r, c))
+        r, c = r + direction[0], c + direction[1]
+    return tuple(squares)
+
+
+RAY_TARGETS = [tuple(_raySquares(sq, direction) for direction in DIRECTIONS) for sq in range(64)]
+
+# rays paired with whether they run towards higher squares, in which case the nearest blocker is the lowest set bit
+ROOK_RAYS = tuple((RAYS[j], DIRECTION_SHIFTS[DIRECTIONS[j]][0] > 0) for j in range(4))
+BISHOP_RAYS = tuple((RAYS[j], DIRECTION_SHIFTS[DIRECTIONS[j]][0] > 0) for j in range(4, 8))
+
+# every square a rook or bishop on sq reaches on an empty board, a slider off these lines can not attack sq
+ROOK_LINES = [RAYS[0][sq] | RAYS[1][sq] | RAYS[2][sq] | RAYS[3][sq] for sq in range(64)]
+BISHOP_LINES = [RAYS[4][sq] | RAYS[5][sq] | RAYS[6][sq] | RAYS[7][sq] for sq in range(64)]
+
+
+def slidingAttacksFrom(sq, occupied, rays):
+    attacks = 0
+    for table, positive in rays:
+        ray = table[sq]
+        blockers = ray & occupied
+        if blockers:
+            if positive:
+                ray ^= table[(blockers & -blockers).bit_length() - 1]
+            else:
+                ray ^= table[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def rookAttacksFrom(sq, occupied):
+    return slidingAttacksFrom(sq, occupied, ROOK_RAYS)
+
+
+def bishopAttacksFrom(sq, occupied):
+    return slidingAttacksFrom(sq, occupied, BISHOP_RAYS)
+
+
+"""
+    BETWEEN[a][b] is the set of squares strictly between two squares that share a rank, file or diagonal, empty if they are not aligned
+"""
+
+BETWEEN = [[0] * 64 for _ in range(64)]
+for _sq in range(64):
+    for _direction in DIRECTIONS:
+        _between = 0
+        for _r, _c in _raySquares(_sq, _direction):
+            BETWEEN[_sq][_r * 8 + _c] = _between
+            _between |= 1 << (_r * 8 + _c)
+
+
+"""
+    Holds the twelve piece sets and the occupancy sets. Sets are indexed by the piece value from the Piece class,
+    so sets[piece.white | piece.Knight] is every white knight and sets[piece.white] is every white piece
+"""
+
+
+class Bitboards():
+    def __init__(self, board, piece):
+        self.piece = piece
+        self.sets = [0] * 24
+        self.occupied = 0
+        # for each color, the set indices of its knights, kings, pawns, rooks, bishops and queens and the pawn capture
+        # table looked up from the attacked square
+        self.attackerPieces = {}
+        for color in (piece.white, piece.black):
+            self.attackerPieces[color] = (color | piece.Knight, color | piece.King, color | piece.Pawn, color | piece.Rook,
+                                          color | piece.Bishop, color | piece.Queen, PAWN_ATTACKS[color != piece.white])
+        self.setBoard(board)
+
+    """
+        Rebuilds every set from the board
+    """
+
+    def setBoard(self, board):
+        sets = self.sets
+        for i in range(len(sets)):
+            sets[i] = 0
+        getPieceColor = self.piece.getPieceColor
+        occupied = 0
+        for sq, chessPiece in enumerate(chain.from_iterable(board)):
+            if chessPiece != 0:
+                bit = 1 << sq
+                sets[chessPiece] |= bit
+                sets[getPieceColor(chessPiece)] |= bit
+                occupied |= bit
+        self.occupied = occupied
+
+    def addPiece(self, chessPiece, sq):
+        bit = 1 << sq
+        self.sets[chessPiece] |= bit
+        self.sets[self.piece.getPieceColor(chessPiece)] |= bit
+        self.occupied |= bit
+
+    def removePiece(self, chessPiece, sq):
+        bit = 1 << sq
+        self.sets[chessPiece] ^= bit
+        self.sets[self.piece.getPieceColor(chessPiece)] ^= bit
+        self.occupied ^= bit
+
+    """
+        Mirrors GameState.makeMove, pieceLanded is the piece on the end square after the move (differs from pieceMoved on promotion)
+    """
+
+    def makeMove(self, move, pieceLanded):
+        startSq = move.startRow * 8 + move.startCol
+        endSq = move.endRow * 8 + move.endCol
+        if move.isEnpassantMove:
+            self.removePiece(move.pieceCaptured, move.startRow * 8 + move.endCol)
+        elif move.pieceCaptured != 0:
+            self.removePiece(move.pieceCaptured, endSq)
+        self.removePiece(move.pieceMoved, startSq)
+        self.addPiece(pieceLanded, endSq)
+
+        if move.isCastleMove:
+            rook = self.piece.getPieceColor(move.pieceMoved) | self.piece.Rook
+            if move.endCol - move.startCol == 2:
+                self.removePiece(rook, endSq + 1)
+                self.addPiece(rook, endSq - 1)
+            else:
+                self.removePiece(rook, endSq - 2)
+                self.addPiece(rook, endSq + 1)
+
+    """
+        Mirrors GameState.undoMove
+    """
+
+    def undoMove(self, move, pieceLanded):
+        startSq = move.startRow * 8 + move.startCol
+        endSq = move.endRow * 8 + move.endCol
+        self.removePiece(pieceLanded, endSq)
+        self.addPiece(move.pieceMoved, startSq)
+        if move.isEnpassantMove:
+            self.addPiece(move.pieceCaptured, move.startRow * 8 + move.endCol)
+        elif move.pieceCaptured != 0:
+            self.addPiece(move.pieceCaptured, endSq)
+
+        if move.isCastleMove:
+            rook = self.piece.getPieceColor(move.pieceMoved) | self.piece.Rook
+            if move.endCol - move.startCol == 2:
+                self.removePiece(rook, endSq - 1)
+                self.addPiece(rook, endSq + 1)
+            else:
+                self.removePiece(rook, endSq + 1)
+                self.addPiece(rook, endSq - 2)
+
+    """
+        Returns the set of pieces of byColor that attack sq, using the given occupancy for sliding pieces
+    """
+
+    def attackersTo(self, sq, byColor, occupied):
+        sets = self.sets
+        knight, king, pawn, rook, bishop, queen, pawnAttacks = self.attackerPieces[byColor]
+        # a white pawn attacks sq from the squares a black pawn on sq would attack
+        attackers = KNIGHT_ATTACKS[sq] & sets[knight] | KING_ATTACKS[sq] & sets[king] | pawnAttacks[sq] & sets[pawn]
+        queens = sets[queen]
+        rookSliders = (sets[rook] | queens) & ROOK_LINES[sq]
+        if rookSliders:
+            attackers |= rookAttacksFrom(sq, occupied) & rookSliders
+        bishopSliders = (sets[bishop] | queens) & BISHOP_LINES[sq]
+        if bishopSliders:
+            attackers |= bishopAttacksFrom(sq, occupied) & bishopSliders
+        return attackers
+
+    """
+        Whether any byColor piece attacks sq with the given occupancy. Stops at the first attacker found and only looks
+        along the rays that hold a slider, where the slider must be the nearest piece
+    """
+
+    def isAttacked(self, sq, byColor, occupied):
+        sets = self.sets
+        knight, king, pawn, rook, bishop, queen, pawnAttacks = self.attackerPieces[byColor]
+        if KNIGHT_ATTACKS[sq] & sets[knight] or KING_ATTACKS[sq] & sets[king] or pawnAttacks[sq] & sets[pawn]:
+            return True
+        queens = sets[queen]
+        for sliders, rays in (((sets[rook] | queens) & ROOK_LINES[sq], ROOK_RAYS),
+                              ((sets[bishop] | queens) & BISHOP_LINES[sq], BISHOP_RAYS)):
+            if not sliders:
+                continue
+            for table, positive in rays:
+                ray = table[sq]
+                if ray & sliders:
+                    blockers = ray & occupied
+                    if blockers:
+                        nearest = blockers & -blockers if positive else 1 << (blockers.bit_length() - 1)
+                        if nearest & sliders:
+                            return True
+        return False
+
+    def isSquareAttacked(self, sq, byColor):
+        return self.isAttacked(sq, byColor, self.occupied)
+
+    """
+        Returns the set of allyColor pieces pinned to the king on kingSq and a dictionary mapping each pinned square to the
+        squares it may still move to (the line between the king and the pinning piece, including the pinning piece)
+    """
+
+    def getPins(self, kingSq, allyColor, enemyColor):
+        piece = self.piece
+        sets = self.sets
+        occupied = self.occupied
+        allies = sets[allyColor]
+        queens = sets[enemyColor | piece.Queen]
+        rookSliders = sets[enemyColor | piece.Rook] | queens
+        bishopSliders = sets[enemyColor | piece.Bishop] | queens
+        pinned = 0
+        pinRays = {}
+        for rays, sliders in ((ROOK_RAYS, rookSliders), (BISHOP_RAYS, bishopSliders)):
+            if not sliders:
+                continue
+            for table, positive in rays:
+                blockers = table[kingSq] & occupied
+                if not blockers:
+                    continue
+                # the nearest blocker must be ours and the one behind it an enemy slider
+                nearest = blockers & -blockers if positive else 1 << (blockers.bit_length() - 1)
+                if not nearest & allies:
+                    continue
+                blockers ^= nearest
+                if not blockers:
+                    continue
+                behind = blockers & -blockers if positive else 1 << (blockers.bit_length() - 1)
+                if behind & sliders:
+                    pinned |= nearest
+                    pinRays[nearest.bit_length() - 1] = BETWEEN[kingSq][behind.bit_length() - 1] | behind
+        return pinned, pinRays
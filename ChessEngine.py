@@ -2,66 +2,167 @@
 This class holds all information about the current state of a chess game. It will be responsible for determining valid moves, as well as keeping a move log.
 """
 
+import json
+import random
+from itertools import chain
+from ChessBitboard import *
+
 
 class GameState():
-    def __init__(self, fen):
+    def __init__(self, fen, useBitboards=False, fenString=None):
         """
             8x8 2d array representing the board, each element is a 2 character string. The first character represents the color, second character represents the type of piece.
+
+            useBitboards keeps a Bitboards copy of the position in sync with the board and uses it for move generation and attack tests
+
+            fenString sets up the game from a full FEN string (side to move, castle rights, en passant square and move
+            clocks included), the standard starting position by default
         """
-        # self.fenString = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-        self.fenString = "r3k2r/pppppppp/8/8/8/8/PPPPPnPP/R3K2R w KQkq - 0 1"
-        self.board = fen.buildBoard(self.fenString)
-        self.whiteToMove = True
+        self.fen = fen
+        self.board = [[0] * 8 for _ in range(8)]
         self.moveLog = []
-        self.whiteKingLocation = (7, 4)
-        self.blackKingLocation = (0, 4)
+        self.bitboards = Bitboards(self.board, piece) if useBitboards else None
+        self.setFen(fenString if fenString is not None else START_FEN)
+
+    """
+        Builds a new game from a FEN string
+    """
+
+    @classmethod
+    def fromFen(cls, fenString, useBitboards=False):
+        return cls(Fen(), useBitboards, fenString)
+
+    """
+        Sets the game up from a FEN string, the move clocks may be left off as in EPD. The board lists and the bitboards
+        are filled in place so one GameState can load position after position. Raises ValueError for an invalid FEN,
+        leaving the game as it was
+    """
+
+    def setFen(self, fenString):
+        fen = self.fen
+        # every field is read before anything is changed
+        board = [[0] * 8 for _ in range(8)]
+        try:
+            fields = fenString.split()
+            if not 4 <= len(fields) <= 6 or fields[1] not in ("w", "b"):
+                raise ValueError()
+            fen.fillBoard(board, fields[0])
+            whiteToMove = fen.getWhiteToMove(fields)
+            castleRights = fen.getCastleRights(fields)
+            enpassantPossible = fen.getEnpassantSquare(fields)
+            halfmoveClock, fullmoveNumber = fen.getMoveClocks(fields)
+        except (ValueError, KeyError, IndexError):
+            raise ValueError("Invalid FEN string: " + fenString)
+        whiteKingLocation = fen.getKingLocation(board, WHITE)
+        blackKingLocation = fen.getKingLocation(board, BLACK)
+        if whiteKingLocation == () or blackKingLocation == ():
+            raise ValueError("FEN string needs a king of each color: " + fenString)
+
+        for boardRow, row in zip(self.board, board):
+            boardRow[:] = row
+        self.whiteToMove = whiteToMove
+        self.currentCastleRights = castleRights
+        # square where en passant is possible, empty when there is none
+        self.enpassantPossible = enpassantPossible
+        # half moves since the last capture or pawn move, and the number of the move being played
+        self.halfmoveClock, self.fullmoveNumber = halfmoveClock, fullmoveNumber
+        self.whiteKingLocation = whiteKingLocation
+        self.blackKingLocation = blackKingLocation
+        self.fenString = fenString
+        self.moveLog.clear()
         self.inCheck = False
-        self.pins = []
+        # square (row * 8 + col) of each pinned piece: the squares of its pin line
+        self.pins = {}
         self.checks = []
+        # the squares a move other than a king move must land on to answer a check
+        self.checkMask = FULL
         self.checkmate = False
         self.stalemate = False
 
-        # square where en passant is possible, right now it is empty
-        self.enpassantPossible = ()
-
-        self.currentCastleRights = Castle(True, True, True, True)
+        self.enpassantLog = [self.enpassantPossible]
+        self.halfmoveClockLog = [self.halfmoveClock]
         self.castleLog = [Castle(self.currentCastleRights.whiteKingSideCastle,
                                  self.currentCastleRights.whiteQueenSideCastle,
                                  self.currentCastleRights.blackKingSideCastle,
                                  self.currentCastleRights.blackQueenSideCastle
                                  )]
 
+        if self.bitboards is not None:
+            self.bitboards.setBoard(self.board)
+
+        # 64 bit position key, kept up to date by makeMove and undoMove
+        self.zobristKey = self.computeZobristKey()
+        self.zobristLog = [self.zobristKey]
 
+        # running white minus black material and piece-square scores and the count of each piece, kept up to date by
+        # makeMove and undoMove so the evaluation does not have to scan the board
+        self.materialScore, self.pieceSquareScore, self.pieceCounts = self.computeScores()
+
+    """
+        Returns the FEN string of the current position, all six fields
     """
-    Takes a move as a parameter and executes it
 
-    TODO:
-    This does not work on castling, en passant
+    def toFen(self):
+        symbols = self.fen.symbolFromPiece
+        rows = []
+        for boardRow in self.board:
+            row = ""
+            empty = 0
+            for square in boardRow:
+                if square == 0:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += symbols[square]
+            if empty:
+                row += str(empty)
+            rows.append(row)
+
+        castleRights = self.currentCastleRights
+        castling = "".join(symbol for symbol, right in (("K", castleRights.whiteKingSideCastle),
+                                                        ("Q", castleRights.whiteQueenSideCastle),
+                                                        ("k", castleRights.blackKingSideCastle),
+                                                        ("q", castleRights.blackQueenSideCastle)) if right)
+        if self.enpassantPossible != ():
+            enpassant = Move.colsToFiles[self.enpassantPossible[1]] + Move.rowsToRanks[self.enpassantPossible[0]]
+        else:
+            enpassant = "-"
+        return " ".join(("/".join(rows), "w" if self.whiteToMove else "b", castling or "-", enpassant,
+                         str(self.halfmoveClock), str(self.fullmoveNumber)))
+
+    """
+    Takes a move as a parameter and executes it, including castling, en passant and pawn promotion
     """
 
     def makeMove(self, move):
+        # take the old side to move, castle rights and en passant square out of the key, the new ones are added at the end
+        key = self.zobristKey ^ Zobrist.blackToMove ^ Zobrist.castleKey(self.currentCastleRights) ^ Zobrist.enpassantKey(self.enpassantPossible)
         self.board[move.startRow][move.startCol] = 0
         self.board[move.endRow][move.endCol] = move.pieceMoved
         self.moveLog.append(move)
         # update king's location if moved
-        piece = Piece()
-        if piece.getPieceType(move.pieceMoved) == piece.King:
+        if move.pieceMoved & TYPE_MASK == KING:
             if self.whiteToMove:
                 self.whiteKingLocation = (move.endRow, move.endCol)
             else:
                 self.blackKingLocation = (move.endRow, move.endCol)
 
+        # pawn promotion
+        if move.pawnPromotion:
+            self.board[move.endRow][move.endCol] = piece.getPieceColor(
+                move.pieceMoved) | move.promotionChoice
+
         if move.isEnpassantMove:
             self.board[move.startRow][move.endCol] = 0
-            move.pieceCaptured = (
-                piece.white if not self.whiteToMove else piece.black) | piece.Pawn
-
 
-        if piece.getPieceType(move.pieceMoved) == piece.Pawn and abs(move.startRow - move.endRow) == 2:
+        if move.pieceMoved & TYPE_MASK == PAWN and abs(move.startRow - move.endRow) == 2:
             self.enpassantPossible = (
                 (move.startRow + move.endRow) // 2, move.startCol)
         else:
             self.enpassantPossible = ()
+        self.enpassantLog.append(self.enpassantPossible)
 
         # castle move
         if move.isCastleMove:
@@ -77,21 +178,43 @@ class GameState():
                 self.board[move.endRow][move.endCol - 2] = 0
 
         # castle rights
-
         self.updateCastleRights(move, piece)
-        if self.castleLog is None:
-            self.castleLog = [Castle(self.currentCastleRights.whiteKingSideCastle,
+        self.castleLog.append(Castle(self.currentCastleRights.whiteKingSideCastle,
                                      self.currentCastleRights.whiteQueenSideCastle,
                                      self.currentCastleRights.blackKingSideCastle,
                                      self.currentCastleRights.blackQueenSideCastle
-                                     )]
+                                     ))
+
+        pieceLanded = self.board[move.endRow][move.endCol]
+        pieceKeys = Zobrist.pieceKeys
+        key ^= pieceKeys[move.pieceMoved][move.startRow * 8 + move.startCol] ^ pieceKeys[pieceLanded][move.endRow * 8 + move.endCol]
+        if move.isEnpassantMove:
+            key ^= pieceKeys[move.pieceCaptured][move.startRow * 8 + move.endCol]
+        elif move.pieceCaptured != 0:
+            key ^= pieceKeys[move.pieceCaptured][move.endRow * 8 + move.endCol]
+        if move.isCastleMove:
+            rook = piece.getPieceColor(move.pieceMoved) | piece.Rook
+            if move.endCol - move.startCol == 2:
+                key ^= pieceKeys[rook][move.endRow * 8 + move.endCol + 1] ^ pieceKeys[rook][move.endRow * 8 + move.endCol - 1]
+            else:
+                key ^= pieceKeys[rook][move.endRow * 8 + move.endCol - 2] ^ pieceKeys[rook][move.endRow * 8 + move.endCol + 1]
+        self.zobristKey = key ^ Zobrist.castleKey(self.currentCastleRights) ^ Zobrist.enpassantKey(self.enpassantPossible)
+        self.zobristLog.append(self.zobristKey)
+
+        self.updateScores(move, pieceLanded, 1)
+
+        if self.bitboards is not None:
+            self.bitboards.makeMove(move, pieceLanded)
+
+        if move.pieceCaptured != 0 or move.pieceMoved & TYPE_MASK == PAWN:
+            self.halfmoveClock = 0
         else:
-            self.castleLog.append(Castle(self.currentCastleRights.whiteKingSideCastle,
-                                         self.currentCastleRights.whiteQueenSideCastle,
-                                         self.currentCastleRights.blackKingSideCastle,
-                                         self.currentCastleRights.blackQueenSideCastle
-                                         ))
-        self.whiteToMove = not self.whiteToMove                                       
+            self.halfmoveClock += 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if not self.whiteToMove:
+            self.fullmoveNumber += 1
+
+        self.whiteToMove = not self.whiteToMove
 
     """ 
 
@@ -99,35 +222,45 @@ class GameState():
     """
 
     def undoMove(self):
-        if len(self.moveLog) != 0:
-            move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
-            # update king's location if moved
-            piece = Piece()
-            if piece.getPieceType(move.pieceMoved) == piece.King:
-                if self.whiteToMove:
-                    self.whiteKingLocation = (move.startRow, move.startCol)
-                else:
-                    self.blackKingLocation = (move.startRow, move.startCol)
+        if len(self.moveLog) == 0:
+            return
 
-            # undo en passant
-            if move.isEnpassantMove:
-                self.board[move.endRow][move.endCol] = 0
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
-                self.enpassantPossible = (move.endRow, move.endCol)
+        move = self.moveLog.pop()
+        pieceLanded = self.board[move.endRow][move.endCol]
+        self.board[move.startRow][move.startCol] = move.pieceMoved
+        self.board[move.endRow][move.endCol] = move.pieceCaptured
+        self.whiteToMove = not self.whiteToMove
+        # update king's location if moved
+        if move.pieceMoved & TYPE_MASK == KING:
+            if self.whiteToMove:
+                self.whiteKingLocation = (move.startRow, move.startCol)
+            else:
+                self.blackKingLocation = (move.startRow, move.startCol)
 
-            # undo 2 square pawn advance
-            if move.pieceMoved == piece.Pawn and abs(move.startRow - move.endRow) == 2:
-                self.enpassantPossible = ()
+        # undo en passant
+        if move.isEnpassantMove:
+            self.board[move.endRow][move.endCol] = 0
+            self.board[move.startRow][move.endCol] = move.pieceCaptured
 
-            self.whiteToMove = not self.whiteToMove
+        self.enpassantLog.pop()
+        self.enpassantPossible = self.enpassantLog[-1]
 
+        self.halfmoveClockLog.pop()
+        self.halfmoveClock = self.halfmoveClockLog[-1]
+        if not self.whiteToMove:
+            self.fullmoveNumber -= 1
 
-        # undo castle rights
+        self.zobristLog.pop()
+        self.zobristKey = self.zobristLog[-1]
 
+        # undo castle rights
         self.castleLog.pop()
-        self.castleLog = self.castleLog[-1]
+        lastRights = self.castleLog[-1]
+        self.currentCastleRights = Castle(lastRights.whiteKingSideCastle,
+                                          lastRights.whiteQueenSideCastle,
+                                          lastRights.blackKingSideCastle,
+                                          lastRights.blackQueenSideCastle
+                                          )
 
         # undo castle move
         if move.isCastleMove:
@@ -142,17 +275,104 @@ class GameState():
                                         2] = self.board[move.endRow][move.endCol + 1]
                 self.board[move.endRow][move.endCol + 1] = 0
 
+        self.updateScores(move, pieceLanded, -1)
+
+        if self.bitboards is not None:
+            self.bitboards.undoMove(move, pieceLanded)
+
+    """
+        Plays the moves with the given move ids from the current position, used to rebuild a game in another process
+        from its starting FEN and move log
+    """
+
+    def playMoveIDs(self, moveIDs):
+        for moveID in moveIDs:
+            for move in self.getLegalMoves():
+                if move.moveID == moveID:
+                    self.makeMove(move)
+                    break
+            else:
+                raise ValueError("Illegal move id: " + str(moveID))
+
+    """
+        Adds (sign 1, after making the move) or takes back (sign -1, when undoing it) the change a move makes to the
+        material and piece-square scores and the piece counts
+    """
+
+    def updateScores(self, move, pieceLanded, sign):
+        pieceSquareScores = PIECE_SQUARE_SCORES
+        startSq = move.startRow * 8 + move.startCol
+        endSq = move.endRow * 8 + move.endCol
+        materialDelta = MATERIAL_SCORES[pieceLanded] - MATERIAL_SCORES[move.pieceMoved]
+        pieceSquareDelta = pieceSquareScores[pieceLanded][endSq] - pieceSquareScores[move.pieceMoved][startSq]
+        counts = self.pieceCounts
+        counts[move.pieceMoved] -= sign
+        counts[pieceLanded] += sign
+        if move.pieceCaptured != 0:
+            capturedSq = move.startRow * 8 + move.endCol if move.isEnpassantMove else endSq
+            materialDelta -= MATERIAL_SCORES[move.pieceCaptured]
+            pieceSquareDelta -= pieceSquareScores[move.pieceCaptured][capturedSq]
+            counts[move.pieceCaptured] -= sign
+        if move.isCastleMove:
+            rook = pieceSquareScores[piece.getPieceColor(move.pieceMoved) | piece.Rook]
+            if move.endCol - move.startCol == 2:
+                pieceSquareDelta += rook[endSq - 1] - rook[endSq + 1]
+            else:
+                pieceSquareDelta += rook[endSq + 1] - rook[endSq - 2]
+        self.materialScore += sign * materialDelta
+        self.pieceSquareScore += sign * pieceSquareDelta
+
+    """
+        Computes the material score, piece-square score and piece counts from scratch, used to set them up and to verify
+        the incremental updates
+    """
+
+    def computeScores(self):
+        materialScore = 0
+        pieceSquareScore = 0
+        counts = [0] * 24
+        for sq, square in enumerate(chain.from_iterable(self.board)):
+            if square != 0:
+                materialScore += MATERIAL_SCORES[square]
+                pieceSquareScore += PIECE_SQUARE_SCORES[square][sq]
+                counts[square] += 1
+        return materialScore, pieceSquareScore, counts
+
+    """
+        Computes the zobrist key of the current position from scratch, used to set up the key and to verify the incremental updates
+    """
+
+    def computeZobristKey(self):
+        key = 0
+        pieceKeys = Zobrist.pieceKeys
+        for sq, square in enumerate(chain.from_iterable(self.board)):
+            if square != 0:
+                key ^= pieceKeys[square][sq]
+        if not self.whiteToMove:
+            key ^= Zobrist.blackToMove
+        return key ^ Zobrist.castleKey(self.currentCastleRights) ^ Zobrist.enpassantKey(self.enpassantPossible)
+
     """ 
 
     Responsible for all the logic that determines if a move is valid, including checks
     """
 
     def getLegalMoves(self):
+        if self.bitboards is not None:
+            return self.getBitboardLegalMoves()
+        return self.getBoardLegalMoves()
+
+    """
+        Legal move generation for the board backend. Only moves from a square in startMask to a square in endMask are
+        generated, en passant only if enpassant is set. Checkmate and stalemate are only updated when every move is
+        generated
+    """
+
+    def getBoardLegalMoves(self, startMask=FULL, endMask=FULL, enpassant=True):
         tempEnpassantPossible = self.enpassantPossible
-        piece = Piece()
         moves = []
 
-        self.inCheck, self.pins, self.checks = self.getAllPinsAndChecks(piece)
+        self.inCheck, self.pins, self.checks, self.checkMask = self.getAllPinsAndChecks(piece)
         if self.whiteToMove:
             kingRow = self.whiteKingLocation[0]
             kingCol = self.whiteKingLocation[1]
@@ -160,65 +380,51 @@ class GameState():
             kingRow = self.blackKingLocation[0]
             kingCol = self.blackKingLocation[1]
 
-        if self.inCheck:
-            # There is only one check so we can block, take or move king
-            if len(self.checks) == 1:
-                moves = self.getPsuedoLegalMoves()
-                check = self.checks[0]
-                checkRow = check[0]
-                checkCol = check[1]
-                pieceChecking = self.board[checkRow][checkCol]
-                validSquares = []
-                # if knight, must capture knight or move king
-                if piece.getPieceType(pieceChecking) == piece.Knight:
-                    validSquares = [(checkRow, checkCol)]
-                else:
-                    for i in range(1, 8):
-                        availableSquare = (
-                            kingRow + check[2][0] * i, kingCol + check[2][1] * i)
-                        validSquares.append(availableSquare)
-
-                        # stop checking for available squares when you reach the checking piece
-                        if availableSquare[0] == checkRow and availableSquare[1] == checkCol:
-                            break
-
-                    # get rid of any moves that are dont block check, take checking piece or move king
-                    for i in range(len(moves) - 1, -1, -1):
-                        # king moves are already generated so those stay
-                        if piece.getPieceType(moves[i].pieceMoved) != piece.King:
-                            # check if move is inside of valid moves, if not remove from list
-                            if not (moves[i].endRow, moves[i].endCol) in validSquares:
-                                moves.remove(moves[i])
-
-                        # There is a double check or more, so king must move
-            else:
-                moves = self.getKingMoves(kingRow, kingCol, piece=Piece())
+        kingSq = kingRow * 8 + kingCol
 
-        # the king is not in check
+        # There is a double check or more, so king must move
+        if len(self.checks) > 1:
+            if startMask >> kingSq & 1:
+                moves = self.getKingMoves(kingRow, kingCol, piece, endMask)
+        # each piece only generates moves along its pin line that block check or take the checking piece
         else:
-            moves = self.getPsuedoLegalMoves()
-            if self.whiteToMove:
-                moves.extend(self.getCastleMoves(
-                    self.whiteKingLocation[0], self.whiteKingLocation[1], moves))
-            else:
-                moves.extend(self.getCastleMoves(
-                    self.blackKingLocation[0], self.blackKingLocation[1], moves))
-
-        if len(moves) == 0:
-            # checkmate
-            if self.kingInCheck():
-                self.checkmate = True
-            # stalemate
+            moves = self.getPsuedoLegalMoves(startMask, endMask, enpassant)
+            # castling lands the king two squares along the rank
+            if not self.inCheck and startMask >> kingSq & 1 and endMask & CASTLE_TARGETS[kingSq]:
+                for move in self.getCastleMoves(kingRow, kingCol, piece):
+                    if endMask >> (move.endRow * 8 + move.endCol) & 1:
+                        moves.append(move)
+
+        if startMask == FULL and endMask == FULL and enpassant:
+            if len(moves) == 0:
+                # checkmate
+                if self.kingInCheck():
+                    self.checkmate = True
+                # stalemate
+                else:
+                    self.stalemate = True
+            # in the case that we undo a move and checkmate is true, we need to set it to false
             else:
-                self.stalemate = True
-        # in the case that we undo a move and checkmate is true, we need to set it to false
-        else:
-            self.checkmate = False
-            self.stalemate = False
+                self.checkmate = False
+                self.stalemate = False
 
         self.enpassantPossible = tempEnpassantPossible
         return moves
 
+    """
+        Whether a pawn of the side to move stands next to the en passant square's pawn to take it, whether or not the
+        capture is legal
+    """
+
+    def enpassantCapturePossible(self):
+        if self.enpassantPossible == ():
+            return False
+        epRow, epCol = self.enpassantPossible
+        # the capturing pawn stands on the rank the enemy pawn moved to, one file either side
+        pawnRow = epRow + 1 if self.whiteToMove else epRow - 1
+        pawn = (WHITE if self.whiteToMove else BLACK) | PAWN
+        return any(0 <= col < 8 and self.board[pawnRow][col] == pawn for col in (epCol - 1, epCol + 1))
+
     """
         Helper function to check if king is in check
     """
@@ -230,59 +436,174 @@ class GameState():
             return self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
 
     """
-        Helper function to check if a square is under attack
+        Helper function to check if a square is under attack by the side not to move. Looks outwards from the square
+        for knights, pawns, kings and sliders instead of generating the opponent's moves
     """
 
     def squareUnderAttack(self, r, c):
-        self.whiteToMove = not self.whiteToMove
-        oppMoves = self.getPsuedoLegalMoves()
-        self.whiteToMove = not self.whiteToMove
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c:
+        enemyColor = BLACK if self.whiteToMove else WHITE
+        if self.bitboards is not None:
+            return self.bitboards.isSquareAttacked(r * 8 + c, enemyColor)
+
+        board = self.board
+        sq = r * 8 + c
+        enemyKnight = enemyColor | KNIGHT
+        for endRow, endCol in KNIGHT_TARGETS[sq]:
+            if board[endRow][endCol] == enemyKnight:
+                return True
+
+        enemyKing = enemyColor | KING
+        for endRow, endCol in KING_TARGETS[sq]:
+            if board[endRow][endCol] == enemyKing:
+                return True
+
+        # enemy pawns attack the square from the squares our own pawn would capture on
+        enemyPawn = enemyColor | PAWN
+        for endRow, endCol in PAWN_CAPTURE_TARGETS[self.whiteToMove][sq]:
+            if board[endRow][endCol] == enemyPawn:
                 return True
+
+        enemyQueen = enemyColor | QUEEN
+        rays = RAY_TARGETS[sq]
+        for j in range(len(DIRECTIONS)):
+            enemySlider = enemyColor | (ROOK if j < 4 else BISHOP)
+            for endRow, endCol in rays[j]:
+                endPiece = board[endRow][endCol]
+                if endPiece != 0:
+                    if endPiece == enemySlider or endPiece == enemyQueen:
+                        return True
+                    break
         return False
 
     """
-    Responsible for all valid moves of a given piece
+        Returns the set of byColor pieces attacking sq (squares numbered row * 8 + col). Only pieces on a square in
+        occupied count and only those squares block sliding pieces, so pieces can be taken off without touching the board
     """
 
-    def getPsuedoLegalMoves(self):
+    def attackersTo(self, sq, byColor, occupied):
+        if self.bitboards is not None:
+            return self.bitboards.attackersTo(sq, byColor, occupied) & occupied
+
+        board = self.board
+        attackers = 0
+        for pieceType, targets in ((KNIGHT, KNIGHT_TARGETS[sq]), (KING, KING_TARGETS[sq]),
+                                   (PAWN, PAWN_CAPTURE_TARGETS[byColor == BLACK][sq])):
+            for endRow, endCol in targets:
+                if board[endRow][endCol] == byColor | pieceType:
+                    attackers |= 1 << (endRow * 8 + endCol)
+
+        enemyQueen = byColor | QUEEN
+        rays = RAY_TARGETS[sq]
+        for j in range(len(DIRECTIONS)):
+            enemySlider = byColor | (ROOK if j < 4 else BISHOP)
+            for endRow, endCol in rays[j]:
+                endSq = endRow * 8 + endCol
+                if occupied >> endSq & 1:
+                    endPiece = board[endRow][endCol]
+                    if endPiece == enemySlider or endPiece == enemyQueen:
+                        attackers |= 1 << endSq
+                    break
+        return attackers & occupied
+
+    def getOccupied(self):
+        if self.bitboards is not None:
+            return self.bitboards.occupied
+        occupied = 0
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] != 0:
+                    occupied |= 1 << (r * 8 + c)
+        return occupied
+
+    """
+        Static exchange evaluation: the material the side to move wins (negative if it loses material) when it plays the
+        capture and both sides keep recapturing on the end square with their least valuable attacker, either side
+        stopping when carrying on would lose more. Pieces are taken off an occupancy set instead of making moves, so
+        sliding pieces lined up behind an attacker join in once it has captured
+    """
+
+    def see(self, move):
+        values = PIECE_VALUES
+        board = self.board
+        endSq = move.endRow * 8 + move.endCol
+        occupied = self.getOccupied() ^ (1 << (move.startRow * 8 + move.startCol))
+        if move.isEnpassantMove:
+            occupied ^= 1 << (move.startRow * 8 + move.endCol)
+            gains = [values[PAWN]]
+        else:
+            gains = [values[move.pieceCaptured & TYPE_MASK]]
+        # the value of the piece standing on the end square, which the next capture wins
+        if move.pawnPromotion:
+            onSquare = values[move.promotionChoice]
+            gains[0] += onSquare - values[PAWN]
+        else:
+            onSquare = values[move.pieceMoved & TYPE_MASK]
+
+        color = BLACK if self.whiteToMove else WHITE
+        while True:
+            # what color wins if it can recapture
+            gains.append(onSquare - gains[-1])
+            attackers = self.attackersTo(endSq, color, occupied)
+            if not attackers:
+                break
+            attackerSq = -1
+            for sq in iterBits(attackers):
+                value = values[board[sq >> 3][sq & 7] & TYPE_MASK]
+                if attackerSq < 0 or value < onSquare:
+                    attackerSq, onSquare = sq, value
+            occupied ^= 1 << attackerSq
+            color = WHITE if color == BLACK else BLACK
+
+        # the last recapture never happened, each side before it only recaptures if it gains by it
+        for i in range(len(gains) - 2, 0, -1):
+            gains[i - 1] = -max(-gains[i - 1], gains[i])
+        return gains[0]
+
+    """
+    Responsible for all valid moves of a given piece, for the pieces on startMask and moves landing on endMask
+    """
+
+    def getPsuedoLegalMoves(self, startMask=FULL, endMask=FULL, enpassant=True):
         moves = []
-        piece = Piece()
+        allyColor = WHITE if self.whiteToMove else BLACK
         for r in range(len(self.board)):
             for c in range(len(self.board[r])):
-                turn = self.checkTurn(self.board[r][c], piece)
+                chessPiece = self.board[r][c]
 
-                if (turn == piece.white and self.whiteToMove) or (turn == piece.black and not self.whiteToMove):
-                    chessPiece = self.board[r][c]
+                if chessPiece & COLOR_MASK == allyColor and startMask >> (r * 8 + c) & 1:
+                    pieceType = chessPiece & TYPE_MASK
                     # TODO: can try to simplify this if statement
-                    if piece.getPieceType(chessPiece) == piece.Pawn:
-                        moves.extend(self.getPawnMoves(r, c, piece=Piece()))
+                    if pieceType == PAWN:
+                        moves.extend(self.getPawnMoves(r, c, piece, endMask, enpassant))
 
-                    elif piece.getPieceType(chessPiece) == piece.Knight:
-                        moves.extend(self.getKnightMoves(r, c, piece=Piece()))
+                    elif pieceType == KNIGHT:
+                        moves.extend(self.getKnightMoves(r, c, piece, endMask))
 
-                    elif piece.getPieceType(chessPiece) == piece.Rook:
-                        moves.extend(self.getRookMoves(r, c, piece=Piece()))
+                    elif pieceType == ROOK:
+                        moves.extend(self.getRookMoves(r, c, piece, endMask))
 
-                    elif piece.getPieceType(chessPiece) == piece.Bishop:
-                        moves.extend(self.getBishopMoves(r, c, piece=Piece()))
+                    elif pieceType == BISHOP:
+                        moves.extend(self.getBishopMoves(r, c, piece, endMask))
 
-                    elif piece.getPieceType(chessPiece) == piece.Queen:
-                        moves.extend(self.getQueenMoves(r, c, piece=Piece()))
+                    elif pieceType == QUEEN:
+                        moves.extend(self.getQueenMoves(r, c, piece, endMask))
 
-                    elif piece.getPieceType(chessPiece) == piece.King:
-                        moves.extend(self.getKingMoves(r, c, piece=Piece()))
+                    elif pieceType == KING:
+                        moves.extend(self.getKingMoves(r, c, piece, endMask))
 
         return moves
 
     """
-    Checks moves for a check on the king or if a piece is pinned and cannot move
+    Checks moves for a check on the king or if a piece is pinned and cannot move. pins maps the square (row * 8 + col)
+    of each pinned piece to the set of squares on its pin line, up to and including the pinning piece. checkMask is
+    the set of squares a move other than a king move has to land on: the checking piece and the squares between it
+    and the king, or every square when the king is not in check
     """
 
     def getAllPinsAndChecks(self, piece):
-        pins = []
+        pins = {}
         checks = []
+        checkMask = 0
         inCheck = False
         if self.whiteToMove:
             enemyColor = piece.black
@@ -295,69 +616,64 @@ class GameState():
             startRow = self.blackKingLocation[0]
             startCol = self.blackKingLocation[1]
 
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1),
-                      (-1, -1), (-1, 1), (1, -1), (1, 1))
+        rays = RAY_TARGETS[startRow * 8 + startCol]
 
         # check for pins and checks
-        for j in range(len(directions)):
-            direction = directions[j]
+        for j in range(len(DIRECTIONS)):
+            direction = DIRECTIONS[j]
             possiblePin = ()
-            for i in range(1, 8):
-                endRow = startRow + direction[0] * i
-                endCol = startCol + direction[1] * i
-                # ensures endRow and endCol are on the board
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    endPieceColor = piece.getPieceColor(endPiece)
-                    # Checks if the piece in the direction is ally for possible pin
-                    if endPieceColor == allyColor:
+            # the squares from the king out to this one
+            line = 0
+            for i, (endRow, endCol) in enumerate(rays[j], 1):
+                line |= 1 << (endRow * 8 + endCol)
+                endPiece = self.board[endRow][endCol]
+                endPieceColor = piece.getPieceColor(endPiece)
+                # Checks if the piece in the direction is ally for possible pin
+                if endPieceColor == allyColor:
+                    if possiblePin == ():
+                        possiblePin = (endRow, endCol)
+                    # already an ally piece in direction, no possible pin or check
+                    else:
+                        break
+                elif endPieceColor == enemyColor:
+                    # gets the type of piece in direction to check if it can move in given direction
+                    enemyPieceType = piece.getPieceType(endPiece)
+
+                    # checks for piece and the direction that a given piece can move for capture
+                    #! Does not account for knights
+                    if ((enemyPieceType == piece.Rook and 0 <= j <= 3)
+                        or (enemyPieceType == piece.Bishop and 4 <= j <= 7)
+                        or (enemyPieceType == piece.Queen)
+                        or (enemyPieceType == piece.King and i == 1)
+                        or (enemyPieceType == piece.Pawn and i == 1 and ((enemyColor == piece.white and 6 <= j <= 7)
+                                                                         or (enemyColor == piece.black and 4 <= j <= 5)))):
+                        # if pin is empty, then it is a check
                         if possiblePin == ():
-                            possiblePin = (endRow, endCol, direction)
-                        # already an ally piece in direction, no possible pin or check
-                        else:
+                            inCheck = True
+                            checks.append((endRow, endCol, direction))
+                            checkMask |= line
                             break
-                    elif endPieceColor == enemyColor:
-                        # gets the type of piece in direction to check if it can move in given direction
-                        enemyPieceType = piece.getPieceType(endPiece)
-
-                        # checks for piece and the direction that a given piece can move for capture
-                        #! Does not account for knights
-                        if ((enemyPieceType == piece.Rook and 0 <= j <= 3)
-                            or (enemyPieceType == piece.Bishop and 4 <= j <= 7)
-                            or (enemyPieceType == piece.Queen)
-                            or (enemyPieceType == piece.King and i == 1)
-                            or (enemyPieceType == piece.Pawn and i == 1 and ((enemyColor == piece.white and 6 <= j <= 7)
-                                                                             or (enemyColor == piece.black and 4 <= j <= 5)))):
-                            # if pin is empty, then it is a check
-                            if possiblePin == ():
-                                inCheck = True
-                                checks.append((endRow, endCol, direction))
-                                break
-                            # otherwise a piece is in the way, which is now pinned
-                            else:
-                                pins.append(possiblePin)
-                                break
-                        # if the piece is not a piece that can move in the given direction, then it is not a check or pin
+                        # otherwise a piece is in the way, which is now pinned
                         else:
+                            pins[possiblePin[0] * 8 + possiblePin[1]] = line
                             break
-                else:
-                    break
+                    # if the piece is not a piece that can move in the given direction, then it is not a check or pin
+                    else:
+                        break
 
         # checks for knight checks, since the knight is not a sliding piece
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                       (1, -2), (1, 2), (2, -1), (2, 1))
-        for move in knightMoves:
-            endRow = startRow + move[0]
-            endCol = startCol + move[1]
-            # check if move is on board
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                # checks if piece is enemy knight
-                if piece.getPieceColor(endPiece) == enemyColor and piece.getPieceType(endPiece) == piece.Knight:
-                    inCheck = True
-                    checks.append((endRow, endCol, move))
+        for endRow, endCol in KNIGHT_TARGETS[startRow * 8 + startCol]:
+            endPiece = self.board[endRow][endCol]
+            # checks if piece is enemy knight
+            if endPiece == enemyColor | piece.Knight:
+                inCheck = True
+                checks.append((endRow, endCol, (endRow - startRow, endCol - startCol)))
+                checkMask |= 1 << (endRow * 8 + endCol)
 
-        return inCheck, pins, checks
+        if not inCheck:
+            checkMask = FULL
+
+        return inCheck, pins, checks, checkMask
 
 
     """ 
@@ -366,23 +682,35 @@ class GameState():
 
     def updateCastleRights(self, move, piece):
         if move.pieceMoved == (piece.white | piece.King):
-            self.whiteCastleKingside = False
-            self.whiteCastleQueenside = False
+            self.currentCastleRights.whiteKingSideCastle = False
+            self.currentCastleRights.whiteQueenSideCastle = False
         elif move.pieceMoved == (piece.black | piece.King):
-            self.blackCastleKingside = False
-            self.blackCastleQueenside = False
-        elif move.pieceMoved == (piece.white | piece.Rook) or move.pieceCaptured == (piece.white | piece.Rook):
+            self.currentCastleRights.blackKingSideCastle = False
+            self.currentCastleRights.blackQueenSideCastle = False
+        elif move.pieceMoved == (piece.white | piece.Rook):
             if move.startRow == 7:
                 if move.startCol == 0:
-                    self.whiteCastleQueenside = False
+                    self.currentCastleRights.whiteQueenSideCastle = False
                 elif move.startCol == 7:
-                    self.whiteCastleKingside = False
-        elif move.pieceMoved == (piece.black | piece.Rook) | move.pieceCaptured == (piece.black | piece.Rook):
+                    self.currentCastleRights.whiteKingSideCastle = False
+        elif move.pieceMoved == (piece.black | piece.Rook):
             if move.startRow == 0:
                 if move.startCol == 0:
-                    self.blackCastleQueenside = False
+                    self.currentCastleRights.blackQueenSideCastle = False
                 elif move.startCol == 7:
-                    self.blackCastleKingside = False
+                    self.currentCastleRights.blackKingSideCastle = False
+
+        # a rook captured on its starting square can no longer castle
+        if move.pieceCaptured == (piece.white | piece.Rook) and move.endRow == 7:
+            if move.endCol == 0:
+                self.currentCastleRights.whiteQueenSideCastle = False
+            elif move.endCol == 7:
+                self.currentCastleRights.whiteKingSideCastle = False
+        elif move.pieceCaptured == (piece.black | piece.Rook) and move.endRow == 0:
+            if move.endCol == 0:
+                self.currentCastleRights.blackQueenSideCastle = False
+            elif move.endCol == 7:
+                self.currentCastleRights.blackKingSideCastle = False
 
     """ 
 
@@ -392,99 +720,83 @@ class GameState():
     - En passant
     """
 
-    def getPawnMoves(self, r, c, piece):
-        isPinned = False
-        pinDirection = ()
-        for pin in self.pins:
-            if pin[0] == r and pin[1] == c:
-                isPinned = True
-                pinDirection = (pin[2][0], pin[2][1])
-                self.pins.remove(pin)
-                break
+    def getPawnMoves(self, r, c, piece, endMask=FULL, enpassant=True):
+        # a pinned pawn can still move along the pin line, towards or away from the king
+        allowed = self.pins.get(r * 8 + c, FULL) & self.checkMask & endMask
 
         pawnMoves = []
+        # the double step can block a check the single step does not
         if self.whiteToMove:
             if self.board[r-1][c] == 0:
-                if not isPinned or pinDirection == (-1, 0):
-                    pawnMoves.append(Move((r, c), (r-1, c), self.board))
-                    if r == 6 and self.board[r-2][c] == 0:
-                        pawnMoves.append(Move((r, c), (r-2, c), self.board))
-            # capture left
-            if c - 1 >= 0:
-                # checks for black piece
-                if piece.getPieceColor(self.board[r-1][c-1]) == piece.black:
-                    if not isPinned or pinDirection == (-1, -1):
-                        pawnMoves.append(Move((r, c), (r-1, c-1), self.board))
-                # checks for en passant
-                elif (r-1, c-1) == self.enpassantPossible:
-                    pawnMoves.append(
-                        Move((r, c), (r-1, c-1), self.board, isEnpassantPossible=True))
-            # capture right
-            if c + 1 <= 7:
-                # checks for black piece
-                if piece.getPieceColor(self.board[r-1][c+1]) == piece.black:
-                    if not isPinned or pinDirection == (-1, 1):
-                        pawnMoves.append(Move((r, c), (r-1, c+1), self.board))
-                # checks for en passant
-                elif (r-1, c+1) == self.enpassantPossible:
-                    pawnMoves.append(
-                        Move((r, c), (r-1, c+1), self.board, isEnpassantPossible=True))
-
+                if allowed >> ((r-1) * 8 + c) & 1:
+                    self.addPawnMoves(pawnMoves, (r, c), (r-1, c))
+                if r == 6 and self.board[r-2][c] == 0 and allowed >> ((r-2) * 8 + c) & 1:
+                    pawnMoves.append(Move((r, c), (r-2, c), self.board))
         else:
             if self.board[r+1][c] == 0:
-                if not isPinned or pinDirection == (1, 0):
-                    pawnMoves.append(Move((r, c), (r+1, c), self.board))
-                    if r == 1 and self.board[r+2][c] == 0:
-                        pawnMoves.append(Move((r, c), (r+2, c), self.board))
-            # capture left
-            if c - 1 >= 0:
-                if piece.getPieceColor(self.board[r+1][c-1]) == piece.white:
-                    if not isPinned or pinDirection == (1, -1):
-                        pawnMoves.append(Move((r, c), (r+1, c-1), self.board))
-                # checks for en passant
-                elif (r+1, c-1) == self.enpassantPossible:
-                    pawnMoves.append(
-                        Move((r, c), (r+1, c-1), self.board, isEnpassantPossible=True))
-            # capture right
-            if c + 1 <= 7:
-                if piece.getPieceColor(self.board[r+1][c+1]) == piece.white:
-                    if not isPinned or pinDirection == (1, 1):
-                        pawnMoves.append(Move((r, c), (r+1, c+1), self.board))
-                # checks for en passant
-                elif (r+1, c+1) == self.enpassantPossible:
-                    pawnMoves.append(
-                        Move((r, c), (r+1, c+1), self.board, isEnpassantPossible=True))
+                if allowed >> ((r+1) * 8 + c) & 1:
+                    self.addPawnMoves(pawnMoves, (r, c), (r+1, c))
+                if r == 1 and self.board[r+2][c] == 0 and allowed >> ((r+2) * 8 + c) & 1:
+                    pawnMoves.append(Move((r, c), (r+2, c), self.board))
+
+        enemyColor = piece.black if self.whiteToMove else piece.white
+        for endRow, endCol in PAWN_CAPTURE_TARGETS[self.whiteToMove][r * 8 + c]:
+            if piece.getPieceColor(self.board[endRow][endCol]) == enemyColor:
+                if allowed >> (endRow * 8 + endCol) & 1:
+                    self.addPawnMoves(pawnMoves, (r, c), (endRow, endCol))
+            # checks for en passant
+            elif enpassant and (endRow, endCol) == self.enpassantPossible and self.enpassantIsLegal(r, c, endRow, endCol):
+                pawnMoves.append(
+                    Move((r, c), (endRow, endCol), self.board, isEnpassantPossible=True))
 
         return pawnMoves
 
     """
-    Gets all knight moves for the knight located at row, col and returns a list of moves
+        Adds the pawn move, or all four promotions when the pawn reaches the last rank
     """
 
-    def getKnightMoves(self, r, c, piece):
-        isPinned = False
-        for pin in self.pins:
-            if pin[0] == r and pin[1] == c:
-                isPinned = True
-                self.pins.remove(pin)
-                break
+    def addPawnMoves(self, moves, startSq, endSq):
+        move = Move(startSq, endSq, self.board)
+        moves.append(move)
+        if move.pawnPromotion:
+            for promotionChoice in (KNIGHT, BISHOP, ROOK):
+                moves.append(Move(startSq, endSq, self.board, promotionChoice=promotionChoice))
+
+    """
+        En passant takes two pawns off the same rank, which the pin scan cannot see, so the capture is played out on
+        the board and the king is checked for attacks. This also covers captures that do or do not get out of check
+    """
+
+    def enpassantIsLegal(self, r, c, endRow, endCol):
+        pawn = self.board[r][c]
+        captured = self.board[r][endCol]
+        self.board[r][c] = 0
+        self.board[r][endCol] = 0
+        self.board[endRow][endCol] = pawn
+        inCheck = self.kingInCheck()
+        self.board[r][c] = pawn
+        self.board[r][endCol] = captured
+        self.board[endRow][endCol] = 0
+        return not inCheck
 
+    """
+    Gets all knight moves for the knight located at row, col and returns a list of moves
+    """
+
+    def getKnightMoves(self, r, c, piece, endMask=FULL):
         knightMoves = []
-        directions = [(1, 2), (2, 1), (-1, 2), (-2, 1),
-                      (1, -2), (2, -1), (-1, -2), (-2, -1)]
+        # a pinned knight can never stay on the pin line
+        if r * 8 + c in self.pins:
+            return knightMoves
+
+        checkMask = self.checkMask & endMask
         allyColor = piece.white if self.whiteToMove else piece.black
-        for direction in directions:
-            endRow = r + direction[0]
-            endCol = c + direction[1]
-            # checks if move is on board
-            if (endRow < 0 or endRow >= 8) or (endCol < 0 or endCol >= 8):
-                continue
-            if not isPinned:
-                endPositionColor = self.checkTurn(
-                    self.board[endRow][endCol], piece)
-                if endPositionColor != allyColor:
-                    knightMoves.append(
-                        Move((r, c), (endRow, endCol), self.board))
+        for endRow, endCol in KNIGHT_TARGETS[r * 8 + c]:
+            endPositionColor = self.checkTurn(
+                self.board[endRow][endCol], piece)
+            if endPositionColor != allyColor and checkMask >> (endRow * 8 + endCol) & 1:
+                knightMoves.append(
+                    Move((r, c), (endRow, endCol), self.board))
 
         return knightMoves
 
@@ -495,38 +807,29 @@ class GameState():
     - Castling
     """
 
-    def getRookMoves(self, r, c, piece):
-        isPinned = False
-        pinDirection = ()
-        for pin in self.pins:
-            if pin[0] == r and pin[1] == c:
-                isPinned = True
-                pinDirection = (pin[2][0], pin[2][1])
-                if piece.getPieceType(self.board[pin[0]][pin[1]]) != piece.Queen:
-                    self.pins.remove(pin)
-                break
+    def getRookMoves(self, r, c, piece, endMask=FULL):
+        sq = r * 8 + c
+        allowed = self.pins.get(sq, FULL) & self.checkMask & endMask
 
         rookMoves = []
-        directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+        rays = RAY_TARGETS[sq]
         enemyColor = piece.black if self.whiteToMove else piece.white
-        for direction in directions:
-            for moveLength in range(1, 8):
-                endRow = r + direction[0] * moveLength
-                endCol = c + direction[1] * moveLength
-                # checks if move is on board
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not isPinned or pinDirection == direction or pinDirection == (-direction[0], -direction[1]):
-                        endPiece = self.board[endRow][endCol]
-                        endPieceColor = self.checkTurn(endPiece, piece)
-                        if endPiece == 0:
-                            rookMoves.append(
-                                Move((r, c), (endRow, endCol), self.board))
-                        elif endPieceColor == enemyColor:
-                            rookMoves.append(
-                                Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:
-                            break
+        for j in range(0, 4):
+            # skip the directions with nowhere to go, such as those off the pin line
+            if not RAYS[j][sq] & allowed:
+                continue
+            for endRow, endCol in rays[j]:
+                endPiece = self.board[endRow][endCol]
+                endPieceColor = self.checkTurn(endPiece, piece)
+                if endPiece == 0:
+                    if allowed >> (endRow * 8 + endCol) & 1:
+                        rookMoves.append(
+                            Move((r, c), (endRow, endCol), self.board))
+                elif endPieceColor == enemyColor:
+                    if allowed >> (endRow * 8 + endCol) & 1:
+                        rookMoves.append(
+                            Move((r, c), (endRow, endCol), self.board))
+                    break
                 else:
                     break
 
@@ -536,38 +839,29 @@ class GameState():
     Gets all bishop moves for the bishop located at row, col and returns a list of moves
     """
 
-    def getBishopMoves(self, r, c, piece):
-        isPinned = False
-        pinDirection = ()
-        for pin in self.pins:
-            if pin[0] == r and pin[1] == c:
-                isPinned = True
-                pinDirection = (pin[2][0], pin[2][1])
-                if piece.getPieceType(self.board[pin[0]][pin[1]]) != piece.Queen:
-                    self.pins.remove(pin)
-                break
+    def getBishopMoves(self, r, c, piece, endMask=FULL):
+        sq = r * 8 + c
+        allowed = self.pins.get(sq, FULL) & self.checkMask & endMask
 
         bishopMoves = []
-        directions = [(1, 1), (-1, 1), (-1, -1), (1, -1)]
+        rays = RAY_TARGETS[sq]
         enemyColor = piece.black if self.whiteToMove else piece.white
-        for direction in directions:
-            for moveLength in range(1, 8):
-                endRow = r + direction[0] * moveLength
-                endCol = c + direction[1] * moveLength
-                # checks if move is on board
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not isPinned or pinDirection == direction or pinDirection == (-direction[0], -direction[1]):
-                        endPiece = self.board[endRow][endCol]
-                        endPieceColor = self.checkTurn(endPiece, piece)
-                        if endPiece == 0:
-                            bishopMoves.append(
-                                Move((r, c), (endRow, endCol), self.board))
-                        elif endPieceColor == enemyColor:
-                            bishopMoves.append(
-                                Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:
-                            break
+        for j in range(4, 8):
+            # skip the directions with nowhere to go, such as those off the pin line
+            if not RAYS[j][sq] & allowed:
+                continue
+            for endRow, endCol in rays[j]:
+                endPiece = self.board[endRow][endCol]
+                endPieceColor = self.checkTurn(endPiece, piece)
+                if endPiece == 0:
+                    if allowed >> (endRow * 8 + endCol) & 1:
+                        bishopMoves.append(
+                            Move((r, c), (endRow, endCol), self.board))
+                elif endPieceColor == enemyColor:
+                    if allowed >> (endRow * 8 + endCol) & 1:
+                        bishopMoves.append(
+                            Move((r, c), (endRow, endCol), self.board))
+                    break
                 else:
                     break
 
@@ -577,10 +871,10 @@ class GameState():
     Gets all queen moves for the queen located at row, col and returns a list of moves
     """
 
-    def getQueenMoves(self, r, c, piece):
+    def getQueenMoves(self, r, c, piece, endMask=FULL):
         queenMoves = []
-        queenMoves.extend(self.getRookMoves(r, c, piece))
-        queenMoves.extend(self.getBishopMoves(r, c, piece))
+        queenMoves.extend(self.getRookMoves(r, c, piece, endMask))
+        queenMoves.extend(self.getBishopMoves(r, c, piece, endMask))
         return queenMoves
 
     """
@@ -590,32 +884,22 @@ class GameState():
     - Castling
     """
 
-    def getKingMoves(self, r, c, piece):
+    def getKingMoves(self, r, c, piece, endMask=FULL):
         kingMoves = []
-        possibleKingMoves = [(1, 0), (1, 1), (0, 1), (-1, 1),
-                             (-1, 0), (-1, -1), (0, -1), (1, -1)]
         allyColor = piece.white if self.whiteToMove else piece.black
 
-        for move in possibleKingMoves:
-            endRow = r + move[0]
-            endCol = c + move[1]
-            # check if move not on board
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPositionColor = self.checkTurn(
-                    self.board[endRow][endCol], piece)
-                if endPositionColor != allyColor:
-                    if allyColor == piece.white:
-                        self.whiteKingLocation = (endRow, endCol)
-                    else:
-                        self.blackKingLocation = (endRow, endCol)
-                    inCheck, pins, checks = self.getAllPinsAndChecks(piece)
-                    if not inCheck:
-                        kingMoves.append(
-                            Move((r, c), (endRow, endCol), self.board))
-                    if allyColor == piece.white:
-                        self.whiteKingLocation = (r, c)
-                    else:
-                        self.blackKingLocation = (r, c)
+        for endRow, endCol in KING_TARGETS[r * 8 + c]:
+            endPositionColor = self.checkTurn(
+                self.board[endRow][endCol], piece)
+            if endPositionColor != allyColor and endMask >> (endRow * 8 + endCol) & 1:
+                # lift the king off its square so it cannot block a slider attacking the square behind it
+                king = self.board[r][c]
+                self.board[r][c] = 0
+                attacked = self.squareUnderAttack(endRow, endCol)
+                self.board[r][c] = king
+                if not attacked:
+                    kingMoves.append(
+                        Move((r, c), (endRow, endCol), self.board))
 
         return kingMoves
 
@@ -643,7 +927,7 @@ class GameState():
 
     def getKingSideCastleMoves(self, r, c, piece):
         kingSideCastleMoves = []
-        if self.board[r][c+1] == 0 or self.board[r][c+2] == 0:
+        if self.board[r][c+1] == 0 and self.board[r][c+2] == 0:
             if not self.squareUnderAttack(r, c+1) and not self.squareUnderAttack(r, c+2):
                 kingSideCastleMoves.append(
                     Move((r, c), (r, c+2), self.board, isCastleMove=True))
@@ -670,6 +954,182 @@ class GameState():
     def checkTurn(self, chessPiece, piece):
         return piece.getPieceColor(chessPiece)
 
+    """
+        Legal move generation for the bitboard backend. Pins and checks are resolved with set-wise masks instead of
+        scanning the board, so every move produced here is already legal.
+        Only moves from a square in startMask to a square in endMask are generated, en passant only if enpassant is set.
+        Checkmate and stalemate are only updated when every move is generated
+    """
+
+    def getBitboardLegalMoves(self, startMask=FULL, endMask=FULL, enpassant=True):
+        bitboards = self.bitboards
+        sets = bitboards.sets
+        if self.whiteToMove:
+            allyColor, enemyColor = piece.white, piece.black
+        else:
+            allyColor, enemyColor = piece.black, piece.white
+
+        occupied = bitboards.occupied
+        allies = sets[allyColor]
+        enemies = sets[enemyColor]
+        kingSq = bitScan(sets[allyColor | piece.King])
+        kingRow, kingCol = divmod(kingSq, 8)
+        checkers = bitboards.attackersTo(kingSq, enemyColor, occupied)
+        self.inCheck = checkers != 0
+        moves = []
+
+        # the king may not step onto an attacked square, with the king itself removed so it cannot hide behind its own square
+        occupiedWithoutKing = occupied ^ (1 << kingSq)
+        if startMask >> kingSq & 1:
+            for endSq in iterBits(KING_ATTACKS[kingSq] & ~allies & endMask):
+                if not bitboards.isAttacked(endSq, enemyColor, occupiedWithoutKing):
+                    moves.append(Move((kingRow, kingCol), divmod(endSq, 8), self.board))
+
+        # in double check only the king can move
+        if popCount(checkers) < 2:
+            if checkers:
+                checkerSq = bitScan(checkers)
+                checkMask = checkers | BETWEEN[kingSq][checkerSq]
+            else:
+                checkMask = FULL
+            targets = ~allies & checkMask & endMask
+            pinned, pinRays = bitboards.getPins(kingSq, allyColor, enemyColor)
+
+            for startSq in iterBits(sets[allyColor | piece.Knight] & ~pinned & startMask):
+                self.addBitboardMoves(moves, startSq, KNIGHT_ATTACKS[startSq] & targets)
+
+            queens = sets[allyColor | piece.Queen] & startMask
+            for startSq in iterBits(sets[allyColor | piece.Rook] & startMask | queens):
+                attacks = rookAttacksFrom(startSq, occupied) & targets
+                if pinned >> startSq & 1:
+                    attacks &= pinRays[startSq]
+                self.addBitboardMoves(moves, startSq, attacks)
+
+            for startSq in iterBits(sets[allyColor | piece.Bishop] & startMask | queens):
+                attacks = bishopAttacksFrom(startSq, occupied) & targets
+                if pinned >> startSq & 1:
+                    attacks &= pinRays[startSq]
+                self.addBitboardMoves(moves, startSq, attacks)
+
+            self.getBitboardPawnMoves(moves, allyColor, enemyColor, kingSq, checkMask & endMask, pinned, pinRays,
+                                      startMask, enpassant)
+
+            # castling lands the king two squares along the rank
+            if not checkers and startMask >> kingSq & 1 and endMask & CASTLE_TARGETS[kingSq]:
+                for move in self.getCastleMoves(kingRow, kingCol, piece):
+                    if endMask >> (move.endRow * 8 + move.endCol) & 1:
+                        moves.append(move)
+
+        if startMask == FULL and endMask == FULL and enpassant:
+            self.checkmate = len(moves) == 0 and self.inCheck
+            self.stalemate = len(moves) == 0 and not self.inCheck
+
+        return moves
+
+    """
+        The legal captures (en passant included) and the legal moves onto empty squares, between them every legal move.
+        With promotions the captures come with the pawn pushes onto the last rank, the moves searched by quiescence.
+        Only the moves asked for are generated, by passing the end squares to the backend's move generation
+    """
+
+    def getCaptureMoves(self, promotions=False):
+        allyColor, enemyColor = (WHITE, BLACK) if self.whiteToMove else (BLACK, WHITE)
+        promotionRank, lastRank = (RANK_7, RANK_8) if self.whiteToMove else (RANK_2, RANK_1)
+        if self.bitboards is not None:
+            sets = self.bitboards.sets
+            enemies, pawns, occupied = sets[enemyColor], sets[allyColor | PAWN], self.bitboards.occupied
+            generate = self.getBitboardLegalMoves
+        else:
+            allies, enemies, pawns = self.getColorOccupancy(allyColor)
+            occupied = allies | enemies
+            generate = self.getBoardLegalMoves
+        moves = generate(FULL, enemies, True)
+        pawns &= promotionRank
+        if promotions and pawns:
+            moves.extend(generate(pawns, lastRank & ~occupied, False))
+        return moves
+
+    def getQuietMoves(self):
+        if self.bitboards is not None:
+            return self.getBitboardLegalMoves(FULL, FULL ^ self.bitboards.occupied, False)
+        return self.getBoardLegalMoves(FULL, FULL ^ self.getOccupied(), False)
+
+    """
+        The squares of the allyColor pieces, of the other side's pieces and of the allyColor pawns, read off the board
+    """
+
+    def getColorOccupancy(self, allyColor):
+        allies = enemies = pawns = 0
+        for sq, chessPiece in enumerate(chain.from_iterable(self.board)):
+            if chessPiece == 0:
+                continue
+            if chessPiece & COLOR_MASK == allyColor:
+                allies |= 1 << sq
+                if chessPiece & TYPE_MASK == PAWN:
+                    pawns |= 1 << sq
+            else:
+                enemies |= 1 << sq
+        return allies, enemies, pawns
+
+    """
+        The legal moves from startSq to endSq (squares numbered row * 8 + col), more than one for a promotion. Used to
+        check a move remembered from another position, such as the hash move, is legal here
+    """
+
+    def getLegalMovesBetween(self, startSq, endSq):
+        enpassant = self.enpassantPossible != () and divmod(endSq, 8) == self.enpassantPossible
+        if self.bitboards is not None:
+            return self.getBitboardLegalMoves(1 << startSq, 1 << endSq, enpassant)
+        return self.getBoardLegalMoves(1 << startSq, 1 << endSq, enpassant)
+
+    """
+        Adds a move from startSq to every square in the targets set
+    """
+
+    def addBitboardMoves(self, moves, startSq, targets):
+        startRowCol = divmod(startSq, 8)
+        for endSq in iterBits(targets):
+            moves.append(Move(startRowCol, divmod(endSq, 8), self.board))
+
+    """
+        Pawn pushes, captures and en passant for the bitboard backend
+    """
+
+    def getBitboardPawnMoves(self, moves, allyColor, enemyColor, kingSq, checkMask, pinned, pinRays, startMask=FULL, enpassant=True):
+        bitboards = self.bitboards
+        occupied = bitboards.occupied
+        empty = FULL ^ occupied
+        enemies = bitboards.sets[enemyColor]
+        white = allyColor == piece.white
+        forward = -8 if white else 8
+        startRow = 6 if white else 1
+
+        for startSq in iterBits(bitboards.sets[allyColor | piece.Pawn] & startMask):
+            bit = 1 << startSq
+            oneStep = startSq + forward
+            targets = PAWN_ATTACKS[white][startSq] & enemies
+            if empty >> oneStep & 1:
+                targets |= 1 << oneStep
+                if startSq >> 3 == startRow and empty >> (oneStep + forward) & 1:
+                    targets |= 1 << (oneStep + forward)
+            targets &= checkMask
+            if pinned & bit:
+                targets &= pinRays[startSq]
+            startRowCol = divmod(startSq, 8)
+            for endSq in iterBits(targets):
+                self.addPawnMoves(moves, startRowCol, divmod(endSq, 8))
+
+        # en passant removes two pieces from the same rank, so it is checked by looking for attacks on the king after the capture
+        if enpassant and self.enpassantPossible != ():
+            epRow, epCol = self.enpassantPossible
+            epSq = epRow * 8 + epCol
+            capturedSq = epSq - forward
+            capturedBit = 1 << capturedSq
+            for startSq in iterBits(PAWN_ATTACKS[not white][epSq] & bitboards.sets[allyColor | piece.Pawn] & startMask):
+                occupiedAfter = (occupied ^ (1 << startSq) ^ capturedBit) | (1 << epSq)
+                if not bitboards.attackersTo(kingSq, enemyColor, occupiedAfter) & ~capturedBit:
+                    moves.append(Move(divmod(startSq, 8), (epRow, epCol), self.board, isEnpassantPossible=True))
+
 
 
 """ 
@@ -685,6 +1145,45 @@ class Castle():
         self.blackQueenSideCastle = blackQueenSideCastle
 
 
+# seeded so every process builds the same zobrist keys
+zobristGenerator = random.Random(0x5A0B)
+
+
+"""
+    Random keys used to build the zobrist hash of a position
+"""
+
+
+class Zobrist():
+    # pieceKeys[piece][square], indexed by the piece value like GameState.board. Empty squares hash to 0
+    pieceKeys = [[zobristGenerator.getrandbits(64) for _ in range(64)] for _ in range(24)]
+    pieceKeys[0] = [0] * 64
+    blackToMove = zobristGenerator.getrandbits(64)
+    # one key per castle right, in the order of the Castle class
+    castleKeys = [zobristGenerator.getrandbits(64) for _ in range(4)]
+    # one key per file of the en passant square
+    enpassantKeys = [zobristGenerator.getrandbits(64) for _ in range(8)]
+
+    @staticmethod
+    def castleKey(castleRights):
+        key = 0
+        if castleRights.whiteKingSideCastle:
+            key ^= Zobrist.castleKeys[0]
+        if castleRights.whiteQueenSideCastle:
+            key ^= Zobrist.castleKeys[1]
+        if castleRights.blackKingSideCastle:
+            key ^= Zobrist.castleKeys[2]
+        if castleRights.blackQueenSideCastle:
+            key ^= Zobrist.castleKeys[3]
+        return key
+
+    @staticmethod
+    def enpassantKey(enpassantPossible):
+        if enpassantPossible == ():
+            return 0
+        return Zobrist.enpassantKeys[enpassantPossible[1]]
+
+
 """ 
 
 Responsible for storing all information about the current move. It will also be responsible for determining if a move is valid.
@@ -702,34 +1201,43 @@ class Move():
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
 
-    def __init__(self, startSq, endSq, board, isEnpassantPossible=False, isCastleMove=False):
+    promotionSymbols = {3: "n", 5: "b", 6: "r", 7: "q"}
+
+    # millions of moves are made during a search, slots keep each one small and quick to create
+    __slots__ = ("startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured", "moveID",
+                 "pawnPromotion", "promotionChoice", "isEnpassantMove", "isCastleMove")
 
-        self.startRow = startSq[0]
-        self.startCol = startSq[1]
-        self.endRow = endSq[0]
-        self.endCol = endSq[1]
+    """
+        moveID packs the move into 16 bits: start square | end square << 6 | promotion piece type << 12, with squares
+        numbered row * 8 + col. The promotion is 0 for other moves
+    """
+
+    def __init__(self, startSq, endSq, board, isEnpassantPossible=False, isCastleMove=False, promotionChoice=None):
+        self.startRow, self.startCol = startSq
+        self.endRow, self.endCol = endSq
         self.pieceMoved = board[self.startRow][self.startCol]
         self.pieceCaptured = board[self.endRow][self.endCol]
-        self.moveID = self.startRow * 1000 + self.startCol * \
-            100 + self.endRow * 10 + self.endCol
+        self.moveID = (self.startRow * 8 + self.startCol) | ((self.endRow * 8 + self.endCol) << 6)
 
-        piece = Piece()
-        self.pawnPromotion = (piece.getPieceType(self.pieceMoved) == piece.Pawn and (
+        self.pawnPromotion = (self.pieceMoved & TYPE_MASK == PAWN and (
             self.endRow == 0 or self.endRow == 7))
-        self.promotionChoice = piece.Queen
+        self.promotionChoice = promotionChoice if promotionChoice is not None else QUEEN
+        # promotions to different pieces are different moves
+        if self.pawnPromotion:
+            self.moveID |= self.promotionChoice << 12
         self.isEnpassantMove = isEnpassantPossible
         if self.isEnpassantMove:
-            self.pieceCaptured = piece.Pawn
-            if self.pieceMoved == (piece.white | piece.Pawn):
-                self.pieceCaptured = piece.black
-            else:
-                self.pieceCaptured = piece.white
+            # the captured pawn is beside the pawn moved, not on the end square
+            self.pieceCaptured = (BLACK if self.pieceMoved & COLOR_MASK == WHITE else WHITE) | PAWN
 
         self.isCastleMove = isCastleMove
 
     def getChessNotation(self):
         # can turn into real chess notation if need be
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.pawnPromotion:
+            notation += self.promotionSymbols[self.promotionChoice]
+        return notation
 
     def getRankFile(self, r, c):
         return self.colsToFiles[c] + self.rowsToRanks[r]
@@ -739,6 +1247,31 @@ class Move():
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        return self.moveID
+
+
+"""
+    Piece types, colors and masks as module level constants, for code that runs for every move and should not build
+    a Piece() to read them. The Piece class below holds the same values
+"""
+
+NON = 0
+KING = 1
+PAWN = 2
+KNIGHT = 3
+BISHOP = 5
+ROOK = 6
+QUEEN = 7
+
+WHITE = 8
+BLACK = 16
+
+TYPE_MASK = 0b111
+WHITE_MASK = 0b01000
+BLACK_MASK = 0b10000
+COLOR_MASK = WHITE_MASK | BLACK_MASK
+
 
 """
     Responsible for logic having to do with each piece, holds a binary
@@ -749,21 +1282,21 @@ class Move():
 class Piece():
     # move Piece.White | Piece.Rook -> 0b01110 -> 14
     def __init__(self):
-        self.Non = 0
-        self.King = 1
-        self.Pawn = 2
-        self.Knight = 3
-        self.Bishop = 5
-        self.Rook = 6
-        self.Queen = 7
-
-        self.white = 8
-        self.black = 16
-
-        self.typeMask = 0b111
-        self.whiteMask = 0b01000
-        self.blackMask = 0b10000
-        self.colorMask = self.whiteMask | self.blackMask
+        self.Non = NON
+        self.King = KING
+        self.Pawn = PAWN
+        self.Knight = KNIGHT
+        self.Bishop = BISHOP
+        self.Rook = ROOK
+        self.Queen = QUEEN
+
+        self.white = WHITE
+        self.black = BLACK
+
+        self.typeMask = TYPE_MASK
+        self.whiteMask = WHITE_MASK
+        self.blackMask = BLACK_MASK
+        self.colorMask = COLOR_MASK
 
     def getPieceType(self, piece):
         return piece & self.typeMask
@@ -797,11 +1330,18 @@ class Piece():
         }
 
 
+# shared instance for code that wants the Piece methods, there is no need to build a new one
+piece = Piece()
+
+
 """
     This is responsible for handling fen strings and utility
 """
 
 
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
 class Fen:
 
     piece = Piece()
@@ -815,6 +1355,13 @@ class Fen:
         "k": piece.King
     }
 
+    # every symbol in the piece placement field, with "." for an empty square once the digits are expanded
+    pieceFromSymbol = {".": 0,
+                       **{symbol: BLACK | pieceType for symbol, pieceType in pieceTypeFromSymbol.items()},
+                       **{symbol.upper(): WHITE | pieceType for symbol, pieceType in pieceTypeFromSymbol.items()}}
+    symbolFromPiece = {value: symbol for symbol, value in pieceFromSymbol.items() if value != 0}
+    emptySquares = str.maketrans({str(count): "." * count for count in range(1, 9)})
+
     # ? Init function not needed
     def __init__(self):
         self.squares = [None] * 64
@@ -844,13 +1391,242 @@ class Fen:
 
         return board
 
+    """
+        Fills an existing 8x8 board from the piece placement field of a FEN string, raises ValueError if it is invalid
+    """
+
+    def fillBoard(self, board, placement):
+        rows = placement.translate(self.emptySquares).split("/")
+        if len(rows) != 8 or any(len(row) != 8 for row in rows):
+            raise ValueError("Invalid board layout in FEN string: " + placement)
+        pieceFromSymbol = self.pieceFromSymbol
+        for boardRow, row in zip(board, rows):
+            boardRow[:] = [pieceFromSymbol[char] for char in row]
+
     def getPiece(self, char, piece=Piece()):
         pieceColor = piece.white if char.isupper() else piece.black
         pieceType = self.pieceTypeFromSymbol[char.lower()]
         return pieceColor | pieceType
 
+    """
+        The helpers below read one field out of fields, the fields of a FEN string as split by str.split()
+    """
 
-""" 
+    def getWhiteToMove(self, fields):
+        return fields[1] == "w"
+
+    def getCastleRights(self, fields):
+        castling = fields[2]
+        return Castle("K" in castling, "Q" in castling, "k" in castling, "q" in castling)
+
+    """
+        Returns the en passant square as (row, col), or () when there is none
+    """
+
+    def getEnpassantSquare(self, fields):
+        square = fields[3]
+        if square == "-":
+            return ()
+        return (Move.ranksToRows[square[1]], Move.filesToCols[square[0]])
+
+    """
+        Returns the halfmove clock and fullmove number, 0 and 1 when the FEN string leaves them off
+    """
+
+    def getMoveClocks(self, fields):
+        if len(fields) < 6:
+            return 0, 1
+        return int(fields[4]), int(fields[5])
+
+    def getKingLocation(self, board, color, piece=Piece()):
+        king = color | piece.King
+        for row in range(len(board)):
+            if king in board[row]:
+                return (row, board[row].index(king))
+        return ()
+
+
+"""
+    Reads a file of FEN or EPD positions, one per line, and yields (gs, rest) for each. gs is one GameState set up again
+    for every line, so anything wanted from a position has to be read before moving on to the next. rest is the text
+    after the position, such as EPD operations or a game result. Blank lines and lines starting with # are skipped
+"""
+
+
+def readFenFile(path, useBitboards=False, gs=None):
+    if gs is None:
+        gs = GameState(Fen(), useBitboards)
+    with open(path) as file:
+        for lineNumber, line in enumerate(file, 1):
+            fields = line.split(None, 4)
+            if not fields or fields[0].startswith("#"):
+                continue
+            rest = fields[4] if len(fields) == 5 else ""
+            # EPD lines have no move clocks
+            clocks = rest.split(None, 2)
+            if len(clocks) >= 2 and clocks[0].isdigit() and clocks[1].isdigit():
+                fields[4:] = clocks[:2]
+                rest = clocks[2] if len(clocks) == 3 else ""
+            else:
+                del fields[4:]
+            try:
+                gs.setFen(" ".join(fields))
+            except ValueError as error:
+                raise ValueError(path + " line " + str(lineNumber) + ": " + str(error))
+            yield gs, rest.strip()
+
+
+"""
+    Piece values and piece-square tables used for the running scores kept by GameState, in tenths of a pawn.
+    Tables are from white's point of view laid out like GameState.board (row 0 is the 8th rank), black uses them mirrored
+"""
+
+PIECE_VALUES = {
+    piece.Non: 0,
+    piece.Pawn: 10,
+    piece.Knight: 30,
+    piece.Bishop: 30,
+    piece.Rook: 50,
+    piece.Queen: 90,
+    piece.King: 900
+}
+
+PIECE_SQUARE_TABLES = {
+    piece.Pawn: [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [5, 5, 5, 5, 5, 5, 5, 5],
+        [1, 1, 2, 3, 3, 2, 1, 1],
+        [1, 1, 1, 3, 3, 1, 1, 1],
+        [0, 0, 0, 2, 2, 0, 0, 0],
+        [1, -1, -1, 0, 0, -1, -1, 1],
+        [1, 1, 1, -2, -2, 1, 1, 1],
+        [0, 0, 0, 0, 0, 0, 0, 0]
+    ],
+    piece.Knight: [
+        [-5, -4, -3, -3, -3, -3, -4, -5],
+        [-4, -2, 0, 0, 0, 0, -2, -4],
+        [-3, 0, 1, 2, 2, 1, 0, -3],
+        [-3, 1, 2, 2, 2, 2, 1, -3],
+        [-3, 0, 2, 2, 2, 2, 0, -3],
+        [-3, 1, 1, 2, 2, 1, 1, -3],
+        [-4, -2, 0, 1, 1, 0, -2, -4],
+        [-5, -4, -3, -3, -3, -3, -4, -5]
+    ],
+    piece.Bishop: [
+        [-2, -1, -1, -1, -1, -1, -1, -2],
+        [-1, 0, 0, 0, 0, 0, 0, -1],
+        [-1, 0, 1, 1, 1, 1, 0, -1],
+        [-1, 1, 1, 1, 1, 1, 1, -1],
+        [-1, 0, 1, 1, 1, 1, 0, -1],
+        [-1, 1, 1, 1, 1, 1, 1, -1],
+        [-1, 1, 0, 0, 0, 0, 1, -1],
+        [-2, -1, -1, -1, -1, -1, -1, -2]
+    ],
+    piece.Rook: [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [1, 1, 1, 1, 1, 1, 1, 1],
+        [-1, 0, 0, 0, 0, 0, 0, -1],
+        [-1, 0, 0, 0, 0, 0, 0, -1],
+        [-1, 0, 0, 0, 0, 0, 0, -1],
+        [-1, 0, 0, 0, 0, 0, 0, -1],
+        [-1, 0, 0, 0, 0, 0, 0, -1],
+        [0, 0, 0, 1, 1, 0, 0, 0]
+    ],
+    piece.Queen: [
+        [-2, -1, -1, -1, -1, -1, -1, -2],
+        [-1, 0, 0, 0, 0, 0, 0, -1],
+        [-1, 0, 1, 1, 1, 1, 0, -1],
+        [-1, 0, 1, 1, 1, 1, 0, -1],
+        [0, 0, 1, 1, 1, 1, 0, -1],
+        [-1, 1, 1, 1, 1, 1, 0, -1],
+        [-1, 0, 1, 0, 0, 0, 0, -1],
+        [-2, -1, -1, -1, -1, -1, -1, -2]
+    ],
+    piece.King: [
+        [-3, -4, -4, -5, -5, -4, -4, -3],
+        [-3, -4, -4, -5, -5, -4, -4, -3],
+        [-3, -4, -4, -5, -5, -4, -4, -3],
+        [-3, -4, -4, -5, -5, -4, -4, -3],
+        [-2, -3, -3, -4, -4, -3, -3, -2],
+        [-1, -2, -2, -2, -2, -2, -2, -1],
+        [2, 2, 0, 0, 0, 0, 2, 2],
+        [2, 3, 1, 0, 0, 1, 3, 2]
+    ]
+}
+
+# signed lookups indexed by piece (color | type), positive for white and negative for black
+MATERIAL_SCORES = [0] * 24
+PIECE_SQUARE_SCORES = [[0] * 64 for _ in range(24)]
+
+
+"""
+    Fills MATERIAL_SCORES and PIECE_SQUARE_SCORES from PIECE_VALUES and PIECE_SQUARE_TABLES, they are updated in place so
+    call this again after changing the weights. GameStates created before then keep their old running scores
+"""
+
+
+def buildScoreTables():
+    for pieceType, table in PIECE_SQUARE_TABLES.items():
+        for color, sign in ((piece.white, 1), (piece.black, -1)):
+            MATERIAL_SCORES[color | pieceType] = sign * PIECE_VALUES[pieceType]
+            for sq in range(64):
+                row, col = divmod(sq, 8)
+                # black's tables are white's flipped top to bottom
+                PIECE_SQUARE_SCORES[color | pieceType][sq] = sign * (table[row][col] if color == piece.white else table[7 - row][col])
+
+
+buildScoreTables()
+
+# piece type names used in weight files
+PIECE_NAMES = {
+    piece.Pawn: "pawn",
+    piece.Knight: "knight",
+    piece.Bishop: "bishop",
+    piece.Rook: "rook",
+    piece.Queen: "queen",
+    piece.King: "king"
+}
+
+
+"""
+    Loads piece values and piece-square tables from a JSON weight file, such as one written by Tuner.py, and rebuilds
+    the score tables. Pieces left out of the file keep their weights. Load the weights before creating any GameState
+"""
+
+
+def loadWeights(path):
+    with open(path) as file:
+        weights = json.load(file)
+    pieceValues = weights.get("pieceValues", {})
+    pieceSquareTables = weights.get("pieceSquareTables", {})
+    for pieceType, name in PIECE_NAMES.items():
+        if name in pieceValues:
+            PIECE_VALUES[pieceType] = int(pieceValues[name])
+        if name in pieceSquareTables:
+            table = pieceSquareTables[name]
+            if len(table) != 8 or any(len(row) != 8 for row in table):
+                raise ValueError("The " + name + " piece-square table in " + path + " is not 8x8")
+            PIECE_SQUARE_TABLES[pieceType] = [[int(score) for score in row] for row in table]
+    buildScoreTables()
+
+
+"""
+    Writes piece values and piece-square tables (by default the ones in use) to a JSON weight file for loadWeights
+"""
+
+
+def saveWeights(path, pieceValues=None, pieceSquareTables=None):
+    pieceValues = pieceValues if pieceValues is not None else PIECE_VALUES
+    pieceSquareTables = pieceSquareTables if pieceSquareTables is not None else PIECE_SQUARE_TABLES
+    weights = {
+        "pieceValues": {name: pieceValues[pieceType] for pieceType, name in PIECE_NAMES.items()},
+        "pieceSquareTables": {name: pieceSquareTables[pieceType] for pieceType, name in PIECE_NAMES.items()}
+    }
+    with open(path, "w") as file:
+        file.write(json.dumps(weights, indent=2) + "\n")
+
+
+"""
 Counts all the material on the board and returns a dictionary with the material count for each piece
 """
 
@@ -883,119 +1659,29 @@ class Material():
             'black': 0
         }
 
-    def getPawnMaterial(self, gs):
-        self.pawnMaterial['white'] = 0
-        self.pawnMaterial['black'] = 0
-        for row in range(len(gs.board)):
-            for col in range(len(gs.board[row])):
-                if col == 0:
-                    continue
-                if self.piece.getPieceType(gs.board[row][col]) == self.piece.Pawn:
-                    if self.piece.getPieceColor(gs.board[row][col]) == self.piece.white:
-                        self.pawnMaterial['white'] += 1
-                        if self.pawnMaterial['white'] > 8:
-                            self.pawnMaterial['white'] = 8
-                    else:
-                        self.pawnMaterial['black'] += 1
-                        if self.pawnMaterial['black'] > 8:
-                            self.pawnMaterial['black'] = 8
-
-        return self.pawnMaterial
+    """
+        The counts come from the piece counts GameState keeps up to date, capped at the number each side starts with
+    """
 
-    def getKnightMaterial(self, gs):
-        self.knightMaterial['white'] = 0
-        self.knightMaterial['black'] = 0
+    def countMaterial(self, gs, pieceType, material, maximum):
+        material['white'] = min(gs.pieceCounts[self.piece.white | pieceType], maximum)
+        material['black'] = min(gs.pieceCounts[self.piece.black | pieceType], maximum)
+        return material
 
-        for row in range(len(gs.board)):
-            for col in range(len(gs.board[row])):
-                if gs.board[row][col] == 0:
-                    continue
-                if self.piece.getPieceType(gs.board[row][col]) == self.piece.Knight:
-                    if self.piece.getPieceColor(gs.board[row][col]) == self.piece.white:
-                        self.knightMaterial['white'] += 1
-                        if self.knightMaterial['white'] > 2:
-                            self.knightMaterial['white'] = 2
-                    else:
-                        self.knightMaterial['black'] += 1
-                        if self.knightMaterial['black'] > 2:
-                            self.knightMaterial['black'] = 2
+    def getPawnMaterial(self, gs):
+        return self.countMaterial(gs, self.piece.Pawn, self.pawnMaterial, 8)
 
-        return self.knightMaterial
+    def getKnightMaterial(self, gs):
+        return self.countMaterial(gs, self.piece.Knight, self.knightMaterial, 2)
 
     def getBishopMaterial(self, gs):
-        self.bishopMaterial['white'] = 0
-        self.bishopMaterial['black'] = 0
-
-        for row in range(len(gs.board)):
-            for col in range(len(gs.board[row])):
-                if gs.board[row][col] == 0:
-                    continue
-                if self.piece.getPieceType(gs.board[row][col]) == self.piece.Bishop:
-                    if self.piece.getPieceColor(gs.board[row][col]) == self.piece.white:
-                        self.bishopMaterial['white'] += 1
-                        if self.bishopMaterial['white'] > 2:
-                            self.bishopMaterial['white'] = 2
-                    else:
-                        self.bishopMaterial['black'] += 1
-                        if self.bishopMaterial['black'] > 2:
-                            self.bishopMaterial['black'] = 2
-
-        return self.bishopMaterial
+        return self.countMaterial(gs, self.piece.Bishop, self.bishopMaterial, 2)
 
     def getRookMaterial(self, gs):
-        self.rookMaterial['white'] = 0
-        self.rookMaterial['black'] = 0
-
-        for row in range(len(gs.board)):
-            for col in range(len(gs.board[row])):
-                if gs.board[row][col] == 0:
-                    continue
-                if self.piece.getPieceType(gs.board[row][col]) == self.piece.Rook:
-                    if self.piece.getPieceColor(gs.board[row][col]) == self.piece.white:
-                        self.rookMaterial['white'] += 1
-                        if self.rookMaterial['white'] > 2:
-                            self.rookMaterial['white'] = 2
-                    else:
-                        self.rookMaterial['black'] += 1
-                        if self.rookMaterial['black'] > 2:
-                            self.rookMaterial['black'] = 2
-
-        return self.rookMaterial
+        return self.countMaterial(gs, self.piece.Rook, self.rookMaterial, 2)
 
     def getQueenMaterial(self, gs):
-        self.queenMaterial['white'] = 0
-        self.queenMaterial['black'] = 0
-        for row in range(len(gs.board)):
-            for col in range(len(gs.board[row])):
-                if gs.board[row][col] == 0:
-                    continue
-                if self.piece.getPieceType(gs.board[row][col]) == self.piece.Queen:
-                    if self.piece.getPieceColor(gs.board[row][col]) == self.piece.white:
-                        self.queenMaterial['white'] += 1
-                        if self.queenMaterial['white'] > 1:
-                            self.queenMaterial['white'] = 1
-                    else:
-                        self.queenMaterial['black'] += 1
-                        if self.queenMaterial['black'] > 1:
-                            self.queenMaterial['black'] = 1
-
-        return self.queenMaterial
+        return self.countMaterial(gs, self.piece.Queen, self.queenMaterial, 1)
 
     def getKingMaterial(self, gs):
-        self.kingMaterial['white'] = 0
-        self.kingMaterial['black'] = 0
-        for row in range(len(gs.board)):
-            for col in range(len(gs.board[row])):
-                if gs.board[row][col] == 0:
-                    continue
-                if self.piece.getPieceType(gs.board[row][col]) == self.piece.King:
-                    if self.piece.getPieceColor(gs.board[row][col]) == self.piece.white:
-                        self.kingMaterial['white'] += 1
-                        if self.kingMaterial['white'] > 1:
-                            self.kingMaterial['white'] = 1
-                    else:
-                        self.kingMaterial['black'] += 1
-                        if self.kingMaterial['black'] > 1:
-                            self.kingMaterial['black'] = 1
-
-        return self.kingMaterial
+        return self.countMaterial(gs, self.piece.King, self.kingMaterial, 1)
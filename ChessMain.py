@@ -15,6 +15,10 @@ HEIGHT = 512
 DIMENSION = 8  # Can potentially allow for the board size to be changed
 SQUARE_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 15  # For animations later on
+AI_TIME_LIMIT = 1  # seconds the AI may think per move
+AI_WORKERS = 1  # processes the AI splits its root moves between
+AI_BOOK = None  # Polyglot opening book (.bin file) the AI plays its first moves from, None to always search
+AI_TABLEBASE = None  # directory of endgame tables written by Tablebase.py the AI plays endings from, None to always search
 IMAGES = {}
 PIECESTOIMAGE = {
     piece.black | piece.Rook: "bR",
@@ -61,7 +65,8 @@ def main():
     screen.fill(pg.Color("white"))
     fen = Fen()
     gs = GameState(fen)
-    ai = AI(gs)
+    ai = AI(gs, depth=None, timeLimit=AI_TIME_LIMIT, workers=AI_WORKERS, book=AI_BOOK,
+            tablebase=AI_TABLEBASE)
     validMoves = gs.getLegalMoves()
     moveMade = False  # Flag variable for when a move is made
     loadPieceImages()
@@ -129,11 +134,6 @@ def main():
                             if move == validMoves[i]:
                                 gs.makeMove(validMoves[i])
                                 print(move.getChessNotation())
-                                if validMoves[i].pawnPromotion:
-                                    gs.board[validMoves[i].endRow][validMoves[i].endCol] = \
-                                        piece.getPieceColor(
-                                        gs.board[validMoves[i].endRow][validMoves[i].endCol]) | \
-                                        validMoves[i].promotionChoice
                                 moveMade = True
                             selectedSquare = ()  # reset user clicks
                             playerCLicks = []
@@ -162,13 +162,7 @@ def main():
                 if AIMove == validMoves[i]:
                     gs.makeMove(validMoves[i])
                     print(AIMove.getChessNotation())
-                    if validMoves[i].pawnPromotion:
-                        gs.board[validMoves[i].endRow][validMoves[i].endCol] = \
-                            piece.getPieceColor(
-                            gs.board[validMoves[i].endRow][validMoves[i].endCol]) | \
-                            validMoves[i].promotionChoice
             moveMade = True
-            time.sleep(1)
 
         if moveMade:
             validMoves = gs.getLegalMoves()
@@ -192,6 +186,8 @@ def main():
     if useTestBench:
         testBench(ai, 3)
 
+    ai.close()
+
 
 """ 
     Responsible for all the graphics within a current game state.
@@ -1,22 +1,36 @@
+import os
 from ChessEngine import *
 
+# numpy is only needed for the batch evaluation
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 piece = Piece()
 material = Material()
 CHECKMATE = 9999
 
+# weights written by Tuner.py, loaded by Evaluate when the file exists
+WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weights.json")
+
+# the piece on each of the 12 bitplanes of a position: white pawn, knight, bishop, rook, queen, king, then black
+BITPLANE_PIECES = [color | pieceType for color in (WHITE, BLACK) for pieceType in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING)]
+
 
 class Evaluate:
-    def __init__(self):
-        self.pieceEval = {
-            piece.Non: 0,
-            piece.Pawn: 10,
-            piece.Knight: 30,
-            piece.Bishop: 30,
-            piece.Rook: 50,
-            piece.Queen: 90,
-            piece.King: 900
-        }
+    """
+        weightsFile is a weight file to load, by default WEIGHTS_FILE if there is one. The weights are shared with
+        GameState's running scores, so create the Evaluate before any GameState
+    """
+
+    def __init__(self, weightsFile=None):
+        if weightsFile is None and os.path.exists(WEIGHTS_FILE):
+            weightsFile = WEIGHTS_FILE
+        if weightsFile is not None:
+            loadWeights(weightsFile)
+        self.pieceEval = PIECE_VALUES
 
     """ 
     Evaluates the state of the board, a positive value means white is winning, a negative value means black is winning in terms of pieces
@@ -31,14 +45,62 @@ class Evaluate:
         elif gs.stalemate:
             return 0
 
-        evaluation = 0
+        return gs.materialScore
+
+    """
+    Material plus piece-square scores, read from the running totals GameState keeps so it does not scan the board.
+    Checkmate and stalemate are left to the search, the flags are only up to date after generating every legal move
+    """
+
+    def evaluatePosition(self, gs):
+        return gs.materialScore + gs.pieceSquareScore
+
+    """
+    Material plus piece-square scores for N positions at once, boards is an (N, 64) array of piece values laid out like
+    GameState.board (square row * 8 + col). Returns an array of N scores, positive when white is ahead
+    """
+
+    def evaluateBatch(self, boards):
+        requireNumpy()
+        boards = np.asarray(boards, dtype=np.intp).reshape(-1, 64)
+        pieceSquareScores = np.asarray(PIECE_SQUARE_SCORES) + np.asarray(MATERIAL_SCORES)[:, None]
+        return pieceSquareScores[boards, np.arange(64)].sum(axis=1)
+
+    """
+    The same scores for positions packed as 12 bitplanes each, an (N, 12, 64) or (N, 12, 8, 8) array of 0s and 1s with
+    the planes in BITPLANE_PIECES order
+    """
+
+    def evaluateBitplanes(self, planes):
+        requireNumpy()
+        planes = np.asarray(planes).reshape(-1, len(BITPLANE_PIECES), 64)
+        weights = np.asarray([[MATERIAL_SCORES[chessPiece] + score for score in PIECE_SQUARE_SCORES[chessPiece]]
+                              for chessPiece in BITPLANE_PIECES])
+        return np.tensordot(planes.astype(weights.dtype), weights, axes=([1, 2], [0, 1]))
+
+
+def requireNumpy():
+    if np is None:
+        raise ImportError("numpy is needed for batch evaluation")
+
+
+"""
+    Packs the boards of the given game states into an (N, 64) int8 array for evaluateBatch. The boards are copied as
+    they are read, so the states can come from readFenFile, which reuses one GameState
+"""
+
+
+def packBoards(states):
+    requireNumpy()
+    return np.array([list(chain.from_iterable(gs.board)) for gs in states], dtype=np.int8).reshape(-1, 64)
+
+
+"""
+    Converts an (N, 64) array of boards to (N, 12, 64) bitplanes in BITPLANE_PIECES order
+"""
 
-        for row in range(len(gs.board)):
-            for col in range(len(gs.board[row])):
-                pieceType = piece.getPieceType(gs.board[row][col])
-                if gs.whiteToMove:
-                    evaluation += self.pieceEval[pieceType]
-                else:
-                    evaluation -= self.pieceEval[pieceType]
 
-        return evaluation
+def boardsToBitplanes(boards):
+    requireNumpy()
+    boards = np.asarray(boards).reshape(-1, 64)
+    return (boards[:, None, :] == np.asarray(BITPLANE_PIECES, dtype=boards.dtype)[None, :, None]).astype(np.uint8)
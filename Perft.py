@@ -0,0 +1,305 @@
+"""
+Perft benchmark for the move generator. Counts the leaf nodes of the move tree from a set of standard positions,
+checks the counts against the known values and reports the time taken and nodes per second as JSON.
+
+    python Perft.py                                   every position to depth 3
+    python Perft.py --depth 4 --positions startpos kiwipete
+    python Perft.py --bitboards --output perft.json
+    python Perft.py --divide --depth 3 --fen "<fen>" --reference stockfish.txt
+    python Perft.py --depth 5 --workers 8 --split-depth 2
+
+Divide mode prints the count under each root move in the same "e2e4: 20" format as other engines' divide output, so
+the two can be compared move by move to find a move generator bug. With --workers the subtrees under each root move
+(or under each reply to a root move, with --split-depth 2) are counted in a pool of processes.
+Exits with status 1 when a node count does not match.
+"""
+
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from ChessEngine import *
+
+fen = Fen()
+
+DEFAULT_DEPTH = 3
+
+# name: (FEN, known node counts at depth 1, 2, 3...)
+PERFT_POSITIONS = {
+    "startpos": ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+                 [20, 400, 8902, 197281, 4865609, 119060324]),
+    # castling, pins and en passant in the middle game
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 [48, 2039, 97862, 4085603, 193690690]),
+    # en passant captures that would leave the king in check along the rank
+    "enpassant": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                  [14, 191, 2812, 43238, 674624, 11030083]),
+    # promotions and underpromotions, with the white king in check
+    "promotion": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                  [6, 264, 9467, 422333, 15833292]),
+    "position5": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                  [44, 1486, 62379, 2103487, 89941194]),
+    "position6": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                  [46, 2079, 89890, 3894594, 164075551])
+}
+
+
+"""
+    Counts the positions reached after depth moves from the current state. With bulk counting the last ply is counted
+    from the length of the legal move list instead of making and undoing every leaf move
+"""
+
+
+def perft(gs, depth, bulk=True):
+    if depth == 0:
+        return 1
+
+    validMoves = gs.getLegalMoves()
+    if bulk and depth == 1:
+        return len(validMoves)
+
+    nodes = 0
+    for move in validMoves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1, bulk)
+        gs.undoMove()
+
+    return nodes
+
+
+"""
+    Perft split by root move, returns {move notation: nodes}
+"""
+
+
+def divide(gs, depth, bulk=True):
+    counts = {}
+    for move in gs.getLegalMoves():
+        gs.makeMove(move)
+        counts[move.getChessNotation()] = perft(gs, depth - 1, bulk)
+        gs.undoMove()
+    return counts
+
+
+"""
+    Returns the move id paths of every line splitDepth moves deep from the current state
+"""
+
+
+def getSubtrees(gs, splitDepth):
+    subtrees = []
+    for move in gs.getLegalMoves():
+        if splitDepth == 1:
+            subtrees.append([move.moveID])
+            continue
+        gs.makeMove(move)
+        for path in getSubtrees(gs, splitDepth - 1):
+            subtrees.append([move.moveID] + path)
+        gs.undoMove()
+    return subtrees
+
+
+"""
+    Counts one subtree in a worker process, the game is rebuilt from its starting FEN, its move log and the path
+"""
+
+
+def perftSubtree(task):
+    fenString, useBitboards, moveIDs, depth, bulk = task
+    gs = GameState(fen, useBitboards, fenString)
+    gs.playMoveIDs(moveIDs)
+    return moveIDs, perft(gs, depth, bulk)
+
+
+"""
+    divide, with the subtrees splitDepth moves deep counted across a pool of worker processes. Splitting below the
+    root moves gives more, smaller tasks so the workers finish closer together
+"""
+
+
+def parallelDivide(gs, depth, bulk=True, workers=None, splitDepth=1):
+    workers = workers or multiprocessing.cpu_count()
+    splitDepth = min(splitDepth, depth - 1)
+    if splitDepth < 1 or workers == 1:
+        return divide(gs, depth, bulk)
+
+    moveLogIDs = [move.moveID for move in gs.moveLog]
+    rootNotations = {move.moveID: move.getChessNotation() for move in gs.getLegalMoves()}
+    tasks = [(gs.fenString, gs.bitboards is not None, moveLogIDs + path, depth - splitDepth, bulk)
+             for path in getSubtrees(gs, splitDepth)]
+    counts = {notation: 0 for notation in rootNotations.values()}
+    chunkSize = max(1, len(tasks) // (workers * 8))
+    with multiprocessing.Pool(workers) as pool:
+        for moveIDs, nodes in pool.imap_unordered(perftSubtree, tasks, chunkSize):
+            counts[rootNotations[moveIDs[len(moveLogIDs)]]] += nodes
+    return counts
+
+
+def parallelPerft(gs, depth, bulk=True, workers=None, splitDepth=1):
+    if depth == 0:
+        return 1
+    return sum(parallelDivide(gs, depth, bulk, workers, splitDepth).values())
+
+
+"""
+    Reads divide output from a file, lines like "e2e4: 20". Anything else, such as a "Nodes searched" total, is skipped
+"""
+
+
+def readReference(path):
+    reference = {}
+    with open(path) as file:
+        for line in file:
+            move, separator, nodes = line.partition(":")
+            move = move.strip()
+            nodes = nodes.strip()
+            if separator and nodes.isdigit() and 4 <= len(move) <= 5:
+                reference[move] = int(nodes)
+    return reference
+
+
+"""
+    Returns a line for every root move whose count differs from the reference, or that only one side generates
+"""
+
+
+def compareDivide(counts, reference):
+    differences = []
+    for move in sorted(set(counts) | set(reference)):
+        if move not in reference:
+            differences.append(move + ": " + str(counts[move]) + " not in reference")
+        elif move not in counts:
+            differences.append(move + ": missing, reference " + str(reference[move]))
+        elif counts[move] != reference[move]:
+            differences.append(move + ": " + str(counts[move]) + " reference " + str(reference[move]))
+    return differences
+
+
+"""
+    Runs perft on one of the bundled positions and returns the result as a dictionary. expected and passed are None
+    when the count at that depth is not known
+"""
+
+
+def runPosition(name, depth, useBitboards=False, bulk=True, fenString=None, workers=1, splitDepth=1):
+    if fenString is not None:
+        knownNodes = []
+    else:
+        fenString, knownNodes = PERFT_POSITIONS[name]
+    gs = GameState(fen, useBitboards, fenString)
+    start = time.time()
+    if workers == 1:
+        nodes = perft(gs, depth, bulk)
+    else:
+        nodes = parallelPerft(gs, depth, bulk, workers, splitDepth)
+    seconds = time.time() - start
+    expected = knownNodes[depth - 1] if depth <= len(knownNodes) else None
+    return {
+        "position": name,
+        "fen": fenString,
+        "depth": depth,
+        "nodes": nodes,
+        "expected": expected,
+        "passed": nodes == expected if expected is not None else None,
+        "seconds": round(seconds, 4),
+        "nps": int(nodes / seconds) if seconds > 0 else 0
+    }
+
+
+def runBenchmark(names, depth, useBitboards=False, bulk=True, fenString=None, workers=1, splitDepth=1):
+    if fenString is not None:
+        results = [runPosition("custom", depth, useBitboards, bulk, fenString, workers, splitDepth)]
+    else:
+        results = [runPosition(name, depth, useBitboards, bulk, None, workers, splitDepth) for name in names]
+    nodes = sum(result["nodes"] for result in results)
+    seconds = sum(result["seconds"] for result in results)
+    # failed if any count is wrong, None if no count could be checked
+    checked = [result["passed"] for result in results if result["passed"] is not None]
+    return {
+        "backend": "bitboards" if useBitboards else "board",
+        "bulk": bulk,
+        "workers": workers,
+        "depth": depth,
+        "nodes": nodes,
+        "seconds": round(seconds, 4),
+        "nps": int(nodes / seconds) if seconds > 0 else 0,
+        "passed": all(checked) if checked else None,
+        "positions": results
+    }
+
+
+"""
+    Prints the divide counts for one position and compares them with the reference file if one is given
+"""
+
+
+def runDivide(parser, args):
+    if args.fen is not None:
+        fenString = args.fen
+    elif len(args.positions) == 1:
+        fenString = PERFT_POSITIONS[args.positions[0]][0]
+    else:
+        parser.error("divide needs a single position, use --fen or pick one with --positions")
+
+    gs = GameState(fen, args.bitboards, fenString)
+    start = time.time()
+    counts = parallelDivide(gs, args.depth, args.bulk, args.workers, args.splitDepth)
+    seconds = time.time() - start
+    for move in sorted(counts):
+        print(move + ": " + str(counts[move]))
+    print()
+    print("Nodes searched: " + str(sum(counts.values())))
+    print("Time: " + str(round(seconds, 4)) + " seconds")
+
+    if args.reference:
+        differences = compareDivide(counts, readReference(args.reference))
+        print()
+        if differences:
+            print("Differences from " + args.reference + ":")
+            for line in differences:
+                print(line)
+            return 1
+        print("Matches " + args.reference)
+
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft benchmark for the move generator")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="depth to search each position to")
+    parser.add_argument("--positions", nargs="+", choices=list(PERFT_POSITIONS), default=list(PERFT_POSITIONS),
+                        help="positions to run, all of them by default")
+    parser.add_argument("--fen", help="run this position instead of the bundled ones")
+    parser.add_argument("--bitboards", action="store_true", help="use the bitboard move generator")
+    parser.add_argument("--no-bulk", dest="bulk", action="store_false",
+                        help="make and undo every leaf move instead of counting the moves at the last ply")
+    parser.add_argument("--workers", type=int, default=1, help="processes to count the subtrees in, 0 for one per core")
+    parser.add_argument("--split-depth", dest="splitDepth", type=int, choices=[1, 2], default=1,
+                        help="split the work at the root moves (1) or at the replies to them (2)")
+    parser.add_argument("--divide", action="store_true", help="print the node count under each root move")
+    parser.add_argument("--reference", help="divide output to compare against, lines like \"e2e4: 20\"")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    if args.depth < 1:
+        parser.error("depth must be at least 1")
+    if args.workers < 0:
+        parser.error("workers can not be negative")
+    args.workers = args.workers or multiprocessing.cpu_count()
+
+    if args.divide or args.reference:
+        return runDivide(parser, args)
+
+    report = runBenchmark(args.positions, args.depth, args.bitboards, args.bulk, args.fen, args.workers, args.splitDepth)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+
+    return 1 if report["passed"] is False else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,665 @@
+"""
+Endgame tablebases for positions with few pieces left. The generator solves an ending by retrograde analysis and writes
+the distance to mate of every position to a file, the search then looks positions up instead of searching them.
+
+    python Tablebase.py KQvK KRvK KPvK
+    python Tablebase.py --pieces 4 --workers 8
+    python Tablebase.py --probe "8/8/8/4k3/8/8/8/4K2R w - - 0 1"
+
+An ending is named by its material, white's pieces then black's, such as KRvKN. Only the side with more material is
+stored as white, KvKR positions are looked up in KRvK with the board flipped and the colors swapped. A table holds one
+byte per position: 0 for a draw (or a position that can not occur), otherwise the distance to mate in plies plus 1,
+an odd distance is a win for the side to move and an even one a loss. The white king is kept to the a-d files (to
+the a1-d1-d4 triangle without pawns) by mirroring the board, and the table is compressed with zlib on disk.
+
+The positions are set up in a GameState and their moves come from its move generator. Captures and promotions lead
+into other endings, which are generated first. Positions are stored without an en passant square, and a position
+where the side to move could take en passant is not probed. The generator still solves those positions, as the ones a
+double push leads to, so the en passant reply counts towards the distance to mate of the push.
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import time
+import zlib
+from array import array
+from itertools import combinations_with_replacement
+from ChessEngine import *
+from EvaluateState import CHECKMATE
+
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+TABLE_EXTENSION = ".tbl"
+
+# the most pieces, kings included, the endings are generated and probed for
+MAX_PIECES = 4
+
+# a table byte holds the distance to mate plus 1
+MAX_DISTANCE = 254
+
+# positions scanned in one task, the tasks are shared out between the worker processes
+CHUNK_SIZE = 1 << 16
+
+# piece types in the order they are named
+PIECE_TYPES = [KING, QUEEN, ROOK, BISHOP, KNIGHT, PAWN]
+PIECE_LETTERS = {pieceType: letter for pieceType, letter in zip(PIECE_TYPES, "KQRBNP")}
+LETTER_PIECES = {letter: pieceType for pieceType, letter in PIECE_LETTERS.items()}
+
+# the order of the pieces in a table index: the white king, the black king, white's pieces then black's
+PIECE_ORDER = {WHITE | KING: 0, BLACK | KING: 1,
+               **{color | pieceType: 2 + 5 * i + j for i, color in enumerate((WHITE, BLACK))
+                  for j, pieceType in enumerate(PIECE_TYPES[1:])}}
+
+# endings where neither side can be mated
+DRAWN_ENDINGS = {"KvK", "KBvK", "KNvK"}
+
+
+"""
+    The square sq moves to under symmetry t of the board: bit 1 mirrors the files, bit 2 the ranks and bit 4 swaps
+    files and ranks
+"""
+
+
+def transformSquare(sq, t):
+    row, col = divmod(sq, 8)
+    if t & 1:
+        col = 7 - col
+    if t & 2:
+        row = 7 - row
+    if t & 4:
+        row, col = col, row
+    return row * 8 + col
+
+
+SYMMETRIES = [[transformSquare(sq, t) for sq in range(64)] for t in range(8)]
+
+
+def inKingRegion(sq, hasPawns):
+    row, col = divmod(sq, 8)
+    if hasPawns:
+        return col <= 3
+    return col <= 3 and 7 - row <= col
+
+
+# the squares the white king is kept to, and the symmetry that takes a king on each square there. Pawns only allow
+# the board to be mirrored left to right
+KING_SQUARES = {hasPawns: [sq for sq in range(64) if inKingRegion(sq, hasPawns)] for hasPawns in (False, True)}
+KING_SYMMETRY = {hasPawns: [next(t for t in range(2 if hasPawns else 8) if inKingRegion(SYMMETRIES[t][sq], hasPawns))
+                            for sq in range(64)] for hasPawns in (False, True)}
+
+
+"""
+    Name of the ending with the given pieces, white's then black's, such as KRvKN
+"""
+
+
+def getEndingName(pieces):
+    ordered = sorted(pieces, key=PIECE_ORDER.__getitem__)
+    white = "".join(PIECE_LETTERS[pieceType & TYPE_MASK] for pieceType in ordered if pieceType & WHITE)
+    black = "".join(PIECE_LETTERS[pieceType & TYPE_MASK] for pieceType in ordered if pieceType & BLACK)
+    return white + "v" + black
+
+
+def sideKey(side):
+    return -len(side), ["KQRBNP".index(letter) for letter in side]
+
+
+"""
+    An ending is stored with the side with more pieces, or the stronger pieces, as white
+"""
+
+
+def isStoredEnding(name):
+    white, black = name.split("v")
+    return sideKey(white) <= sideKey(black)
+
+
+def flipEnding(name):
+    white, black = name.split("v")
+    return black + "v" + white
+
+
+"""
+    The stored endings a capture or a promotion leads to from the ending, other than the drawn ones
+"""
+
+
+def getRequiredEndings(name):
+    pieces = Ending(name).pieces
+    required = []
+    for i, pieceType in enumerate(pieces):
+        if pieceType & TYPE_MASK == KING:
+            continue
+        following = [pieces[:i] + pieces[i + 1:]]
+        if pieceType & TYPE_MASK == PAWN:
+            color = pieceType & COLOR_MASK
+            following += [pieces[:i] + [color | promotion] + pieces[i + 1:] for promotion in (QUEEN, ROOK, BISHOP, KNIGHT)]
+        for followingPieces in following:
+            followingName = getEndingName(followingPieces)
+            if not isStoredEnding(followingName):
+                followingName = flipEnding(followingName)
+            if followingName not in DRAWN_ENDINGS and followingName not in required:
+                required.append(followingName)
+    return required
+
+
+"""
+    Every stored ending with numPieces pieces, kings included, other than the drawn ones
+"""
+
+
+def getEndings(numPieces):
+    names = []
+    for numWhite in range(numPieces - 1):
+        for white in combinations_with_replacement("QRBNP", numWhite):
+            for black in combinations_with_replacement("QRBNP", numPieces - 2 - numWhite):
+                name = "K" + "".join(white) + "vK" + "".join(black)
+                if isStoredEnding(name) and name not in DRAWN_ENDINGS:
+                    names.append(name)
+    return names
+
+
+class Ending():
+    """
+        The layout of a table: the pieces in index order and how positions are numbered. The index is the side to move,
+        the white king's square out of KING_SQUARES, then the square of every other piece, with the board turned so
+        the white king is in KING_SQUARES
+    """
+
+    def __init__(self, name):
+        white, black = name.split("v")
+        self.name = name
+        self.pieces = sorted([WHITE | LETTER_PIECES[letter] for letter in white] +
+                             [BLACK | LETTER_PIECES[letter] for letter in black], key=PIECE_ORDER.__getitem__)
+        self.hasPawns = "P" in name
+        self.kingSquares = KING_SQUARES[self.hasPawns]
+        self.kingSlots = {sq: slot for slot, sq in enumerate(self.kingSquares)}
+        self.kingSymmetry = KING_SYMMETRY[self.hasPawns]
+        self.size = 2 * len(self.kingSquares) * 64 ** (len(self.pieces) - 1)
+
+    """
+        Index of the position with the pieces on squares (in self.pieces order)
+    """
+
+    def getIndex(self, squares, whiteToMove):
+        symmetry = SYMMETRIES[self.kingSymmetry[squares[0]]]
+        index = (0 if whiteToMove else len(self.kingSquares)) + self.kingSlots[symmetry[squares[0]]]
+        for sq in squares[1:]:
+            index = index * 64 + symmetry[sq]
+        return index
+
+    """
+        Returns (squares, whiteToMove) of the position with the index
+    """
+
+    def getPosition(self, index):
+        squares = []
+        for _ in range(len(self.pieces) - 1):
+            index, sq = divmod(index, 64)
+            squares.append(sq)
+        side, slot = divmod(index, len(self.kingSquares))
+        squares.append(self.kingSquares[slot])
+        squares.reverse()
+        return squares, side == 0
+
+    """
+        Whether the pieces can stand on the squares: one piece a square, no pawns on the first or last rank and the
+        kings apart. Whether the side not to move is in check is left to the GameState
+    """
+
+    def isValid(self, squares):
+        if len(set(squares)) != len(squares):
+            return False
+        whiteKingRow, whiteKingCol = divmod(squares[0], 8)
+        blackKingRow, blackKingCol = divmod(squares[1], 8)
+        if abs(whiteKingRow - blackKingRow) <= 1 and abs(whiteKingCol - blackKingCol) <= 1:
+            return False
+        return all(pieceType & TYPE_MASK != PAWN or 8 <= sq < 56 for pieceType, sq in zip(self.pieces, squares))
+
+    """
+        FEN string of the position, for setting it up in a GameState
+    """
+
+    def getFen(self, squares, whiteToMove):
+        board = ["."] * 64
+        for pieceType, sq in zip(self.pieces, squares):
+            board[sq] = Fen.symbolFromPiece[pieceType]
+        placement = "/".join("".join(board[row * 8:row * 8 + 8]) for row in range(8))
+        placement = re.sub(r"\.+", lambda empty: str(len(empty.group())), placement)
+        return placement + (" w" if whiteToMove else " b") + " - - 0 1"
+
+
+"""
+    Converts a table byte to a score for the side to move like the search's: CHECKMATE less the plies to mate for a
+    win, -CHECKMATE plus the plies to mate for a loss, 0 for a draw
+"""
+
+
+def scoreFromValue(value):
+    if value == 0:
+        return 0
+    distance = value - 1
+    return CHECKMATE - distance if distance % 2 else -CHECKMATE + distance
+
+
+class Tablebase():
+    """
+        directory holds the table files. A table is read the first time a position of its ending is probed and kept,
+        an ending without a table file is not probed. maxPieces caps the pieces, kings included, of the positions probed
+    """
+
+    def __init__(self, directory=TABLEBASE_DIR, maxPieces=MAX_PIECES):
+        self.directory = directory
+        self.maxPieces = maxPieces
+        self.tables = {}
+        self.endings = {}
+
+    def getPath(self, name):
+        return os.path.join(self.directory, name + TABLE_EXTENSION)
+
+    def getEnding(self, name):
+        ending = self.endings.get(name)
+        if ending is None:
+            ending = self.endings[name] = Ending(name)
+        return ending
+
+    """
+        Returns the table of the ending, or None if there is no table file for it
+    """
+
+    def getTable(self, name):
+        if name not in self.tables:
+            table = None
+            path = self.getPath(name)
+            if os.path.exists(path):
+                with open(path, "rb") as file:
+                    table = zlib.decompress(file.read())
+                if len(table) != self.getEnding(name).size:
+                    raise ValueError(path + " is not a table of " + name)
+            self.tables[name] = table
+        return self.tables[name]
+
+    def saveTable(self, name, table):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.getPath(name), "wb") as file:
+            file.write(zlib.compress(table, 9))
+        self.tables[name] = bytes(table)
+
+    """
+        Returns the table byte of the position with the pieces on squares, or None if there is no table for it
+    """
+
+    def lookup(self, pieces, squares, whiteToMove):
+        name = getEndingName(pieces)
+        if not isStoredEnding(name):
+            name = flipEnding(name)
+            pieces = [pieceType ^ COLOR_MASK for pieceType in pieces]
+            squares = [sq ^ 56 for sq in squares]
+            whiteToMove = not whiteToMove
+        if name in DRAWN_ENDINGS:
+            return 0
+        table = self.getTable(name)
+        if table is None:
+            return None
+        order = sorted(range(len(pieces)), key=lambda i: PIECE_ORDER[pieces[i]])
+        return table[self.getEnding(name).getIndex([squares[i] for i in order], whiteToMove)]
+
+    """
+        Score of the position for the side to move (see scoreFromValue), or None if it can not be probed: too many
+        pieces, castling rights, a possible en passant capture or no table for its ending
+    """
+
+    def probe(self, gs):
+        if sum(gs.pieceCounts) > self.maxPieces:
+            return None
+        castleRights = gs.currentCastleRights
+        if castleRights.whiteKingSideCastle or castleRights.whiteQueenSideCastle or \
+                castleRights.blackKingSideCastle or castleRights.blackQueenSideCastle:
+            return None
+        if gs.enpassantCapturePossible():
+            return None
+
+        pieces = []
+        squares = []
+        for sq, square in enumerate(chain.from_iterable(gs.board)):
+            if square != 0:
+                pieces.append(square)
+                squares.append(sq)
+        value = self.lookup(pieces, squares, gs.whiteToMove)
+        return scoreFromValue(value) if value is not None else None
+
+    """
+        Returns (move, score) for the move out of validMoves keeping the best result: the quickest mate when winning,
+        a draw when there is one, the longest defence when losing. None if the position or a move's can not be probed
+    """
+
+    def bestMove(self, gs, validMoves):
+        if self.probe(gs) is None:
+            return None
+        bestMove = None
+        bestScore = -CHECKMATE - 1
+        for move in validMoves:
+            gs.makeMove(move)
+            score = self.probe(gs)
+            gs.undoMove()
+            if score is None:
+                return None
+            # a mate after the move is one ply further away from this position
+            score = -(score - 1 if score > 0 else score + 1 if score < 0 else 0)
+            if score > bestScore:
+                bestMove = move
+                bestScore = score
+        return (bestMove, bestScore) if bestMove is not None else None
+
+
+"""
+    Scans the positions first to last of the ending for the retrograde analysis. Every legal position's moves are
+    generated: a capture or promotion is looked up in the tablebase, any other move is kept as an edge to the position
+    it leads to. Returns (counts, successors, exitLosses, escapes, seeds, enpassantNodes):
+        counts[i]      moves from position first + i that stay in the ending, their positions in order in successors
+        exitLosses[i]  the longest loss, as distance to mate, among its moves out of the ending that lose
+        escapes[i]     1 if a move out of the ending draws or wins, so the position can not be lost
+        seeds          (distance to mate, index) for checkmates and wins by a move out of the ending
+    A double push next to an enemy pawn leads to a position the table does not hold, the one with the en passant
+    capture. It is kept as an extra node in enpassantNodes, keyed by the index of the position without the capture
+    times 8 plus the file of the en passant square, and the edge leading to it is stored as ending.size plus its key.
+    Each node is (successors, exitLoss, escape, seed) with the meanings above and seed its distance or None
+"""
+
+
+def scanPositions(ending, first, last, tablebase, gs):
+    counts = bytearray(last - first)
+    successors = array("I")
+    exitLosses = bytearray(last - first)
+    escapes = bytearray(last - first)
+    seeds = []
+    enpassantNodes = {}
+    for index in range(first, last):
+        squares, whiteToMove = ending.getPosition(index)
+        if not ending.isValid(squares):
+            continue
+        gs.setFen(ending.getFen(squares, whiteToMove))
+        # the side that just moved can not have left its king in check
+        if gs.attackersTo(squares[1] if whiteToMove else squares[0], WHITE if whiteToMove else BLACK, gs.getOccupied()):
+            continue
+
+        i = index - first
+        nodeSuccessors, exitLosses[i], escapes[i], seed = scanMoves(ending, squares, whiteToMove, tablebase, gs,
+                                                                    enpassantNodes)
+        successors.extend(nodeSuccessors)
+        counts[i] = len(nodeSuccessors)
+        if seed is not None:
+            seeds.append((seed, index))
+    return counts, successors, exitLosses, escapes, seeds, enpassantNodes
+
+
+"""
+    Scans the moves of the position set up in gs, with the ending's pieces on squares, and returns
+    (successors, exitLoss, escape, seed) for it as described for scanPositions
+"""
+
+
+def scanMoves(ending, squares, whiteToMove, tablebase, gs, enpassantNodes):
+    moves = gs.getLegalMoves()
+    if not moves:
+        return [], 0, 0, 0 if gs.kingInCheck() else None
+
+    pieces = ending.pieces
+    successors = []
+    exitLoss = 0
+    escape = 0
+    fastestWin = MAX_DISTANCE + 1
+    for move in moves:
+        startSq = move.startRow * 8 + move.startCol
+        endSq = move.endRow * 8 + move.endCol
+        moved = squares.index(startSq)
+        nextSquares = squares[:]
+        nextSquares[moved] = endSq
+        if move.pieceCaptured == 0 and not move.pawnPromotion:
+            nextIndex = ending.getIndex(nextSquares, not whiteToMove)
+            if move.pieceMoved & TYPE_MASK == PAWN and abs(move.endRow - move.startRow) == 2:
+                gs.makeMove(move)
+                if gs.enpassantCapturePossible():
+                    epSq = (move.startRow + move.endRow) // 2 * 8 + move.endCol
+                    key = nextIndex * 8 + SYMMETRIES[ending.kingSymmetry[nextSquares[0]]][epSq] % 8
+                    if key not in enpassantNodes:
+                        enpassantNodes[key] = scanMoves(ending, nextSquares, not whiteToMove, tablebase, gs,
+                                                        enpassantNodes)
+                    nextIndex = ending.size + key
+                gs.undoMove()
+            successors.append(nextIndex)
+            continue
+
+        nextPieces = pieces[:]
+        if move.pawnPromotion:
+            nextPieces[moved] = (move.pieceMoved & COLOR_MASK) | move.promotionChoice
+        if move.pieceCaptured != 0:
+            captured = squares.index(move.startRow * 8 + move.endCol if move.isEnpassantMove else endSq)
+            del nextPieces[captured], nextSquares[captured]
+        value = tablebase.lookup(nextPieces, nextSquares, not whiteToMove)
+        if value is None:
+            raise ValueError(ending.name + " needs the " + getEndingName(nextPieces) + " table")
+        if value == 0:
+            escape = 1
+        elif (value - 1) % 2:
+            # the opponent wins after this move
+            exitLoss = max(exitLoss, value)
+        else:
+            escape = 1
+            fastestWin = min(fastestWin, value)
+
+    if fastestWin <= MAX_DISTANCE:
+        return successors, exitLoss, escape, fastestWin
+    if not successors and not escape:
+        return successors, exitLoss, escape, exitLoss
+    return successors, exitLoss, escape, None
+
+
+"""
+    The tablebase and GameState used by each worker process, set up once per process by initWorker
+"""
+
+workerTablebase = None
+workerGameState = None
+
+
+def initWorker(directory):
+    global workerTablebase, workerGameState
+    workerTablebase = Tablebase(directory)
+    workerGameState = GameState(Fen(), True)
+
+
+def scanTask(task):
+    name, first, last = task
+    return first, last, scanPositions(workerTablebase.getEnding(name), first, last, workerTablebase, workerGameState)
+
+
+"""
+    Solves the ending by retrograde analysis and returns its table. The tables of the endings it leads to have to be in
+    the tablebase. Every move is found once by scanning the positions forwards, then the positions are resolved in order
+    of distance to mate going backwards along the moves: a position one move before a loss is a win, and a position
+    whose every move leads to a win for the opponent is a loss, as long as the longest of those wins. The positions
+    with an en passant capture are solved with the rest, numbered from ending.size on, and left out of the table
+"""
+
+
+def generateTable(name, tablebase, workers=1, log=None):
+    ending = tablebase.getEnding(name)
+    size = ending.size
+    counts = bytearray(size)
+    exitLosses = bytearray(size)
+    escapes = bytearray(size)
+    chunks = []
+    seeds = []
+    enpassantNodes = {}
+
+    tasks = [(name, first, min(first + CHUNK_SIZE, size)) for first in range(0, size, CHUNK_SIZE)]
+    if workers > 1:
+        with multiprocessing.Pool(workers, initializer=initWorker, initargs=(tablebase.directory,)) as pool:
+            results = pool.map(scanTask, tasks)
+    else:
+        gs = GameState(Fen(), True)
+        results = [(first, last, scanPositions(ending, first, last, tablebase, gs)) for _, first, last in tasks]
+    for first, last, (chunkCounts, successors, chunkExitLosses, chunkEscapes, chunkSeeds, chunkNodes) in results:
+        counts[first:last] = chunkCounts
+        exitLosses[first:last] = chunkExitLosses
+        escapes[first:last] = chunkEscapes
+        chunks.append((first, last, successors))
+        seeds += chunkSeeds
+        enpassantNodes.update(chunkNodes)
+    del results
+
+    # the en passant positions go after the ending's, and the edges into them are renumbered to match
+    nodeIndices = {size + key: size + node for node, key in enumerate(enpassantNodes)}
+    successors = array("I")
+    for index, (key, (nodeSuccessors, exitLoss, escape, seed)) in enumerate(enpassantNodes.items(), size):
+        successors.extend(nodeSuccessors)
+        counts.append(len(nodeSuccessors))
+        exitLosses.append(exitLoss)
+        escapes.append(escape)
+        if seed is not None:
+            seeds.append((seed, index))
+    chunks.append((size, size + len(enpassantNodes), successors))
+    size += len(enpassantNodes)
+    del enpassantNodes
+    if log is not None:
+        log("scanned")
+
+    # the moves turned around: the positions leading to position j are predecessors[starts[j]:starts[j + 1]]
+    starts = array("I", bytes(4 * (size + 1)))
+    for first, last, successors in chunks:
+        for move, j in enumerate(successors):
+            if j >= ending.size:
+                j = successors[move] = nodeIndices[j]
+            starts[j + 1] += 1
+    del nodeIndices
+    for j in range(size):
+        starts[j + 1] += starts[j]
+    predecessors = array("I", bytes(4 * starts[size]))
+    filled = array("I", starts)
+    for first, last, successors in chunks:
+        move = 0
+        for index in range(first, last):
+            for j in successors[move:move + counts[index]]:
+                predecessors[filled[j]] = index
+                filled[j] += 1
+            move += counts[index]
+    del chunks, filled
+
+    # moves a position has left that are not known to lose, one more if a move out of the ending saves it
+    remaining = bytearray(count + escape for count, escape in zip(counts, escapes))
+    del counts, escapes
+    table = bytearray(size)
+    buckets = [[] for _ in range(MAX_DISTANCE + 2)]
+    for distance, index in seeds:
+        buckets[distance].append(index)
+    for distance in range(MAX_DISTANCE + 1):
+        for index in buckets[distance]:
+            if table[index]:
+                continue
+            table[index] = distance + 1
+            if distance % 2 == 0:
+                # lost here, so won one move before
+                for previous in predecessors[starts[index]:starts[index + 1]]:
+                    if not table[previous]:
+                        buckets[distance + 1].append(previous)
+            else:
+                for previous in predecessors[starts[index]:starts[index + 1]]:
+                    if not table[previous]:
+                        remaining[previous] -= 1
+                        if remaining[previous] == 0:
+                            buckets[max(distance + 1, exitLosses[previous])].append(previous)
+        buckets[distance] = None
+    if buckets[MAX_DISTANCE + 1]:
+        raise ValueError(name + " has mates longer than " + str(MAX_DISTANCE) + " plies")
+    return table[:ending.size]
+
+
+"""
+    Generates the ending after the endings it leads to, skipping tables that are already there unless forced
+"""
+
+
+def generateEnding(name, tablebase, workers=1, force=False, done=None):
+    done = done if done is not None else set()
+    for required in getRequiredEndings(name):
+        if required not in done:
+            generateEnding(required, tablebase, workers, False, done)
+    done.add(name)
+    if not force and os.path.exists(tablebase.getPath(name)):
+        return
+
+    start = time.time()
+
+    def log(stage):
+        print(name + ": " + stage + " in " + str(round(time.time() - start, 2)) + " seconds")
+
+    table = generateTable(name, tablebase, workers, log)
+    tablebase.saveTable(name, table)
+    whiteWins = blackWins = longest = 0
+    for index in range(len(table)):
+        value = table[index]
+        if value:
+            # odd distances are wins for the side to move, the side is the top bit of the index
+            whiteToMove = index < len(table) // 2
+            whiteWins += ((value - 1) % 2 == 1) == whiteToMove
+            blackWins += ((value - 1) % 2 == 1) != whiteToMove
+            longest = max(longest, value - 1)
+    print(name + ": " + str(whiteWins) + " white wins, " + str(blackWins) + " black wins, longest mate "
+          + str(longest) + " plies, " + str(os.path.getsize(tablebase.getPath(name))) + " bytes")
+    log("done")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Endgame tablebase generator")
+    parser.add_argument("endings", nargs="*", help="endings to generate, such as KQvK or KRvKN")
+    parser.add_argument("--pieces", type=int, help="generate every ending with up to this many pieces, kings included")
+    parser.add_argument("--directory", default=TABLEBASE_DIR, help="where the tables are written and read")
+    parser.add_argument("--workers", type=int, default=1, help="processes the positions are scanned in")
+    parser.add_argument("--force", action="store_true", help="regenerate the endings asked for if they exist")
+    parser.add_argument("--probe", metavar="FEN", help="look a position up instead of generating")
+    args = parser.parse_args(argv)
+
+    tablebase = Tablebase(args.directory)
+    if args.probe:
+        gs = GameState.fromFen(args.probe)
+        result = tablebase.bestMove(gs, gs.getLegalMoves())
+        score = tablebase.probe(gs)
+        if score is None:
+            parser.error("the position is not in the tablebase")
+        if score == 0:
+            print("Draw")
+        else:
+            distance = CHECKMATE - abs(score)
+            print(("Win" if score > 0 else "Loss") + " for the side to move, mate in " + str(distance) + " plies")
+        if result is not None:
+            print("Best move: " + result[0].getChessNotation())
+        return 0
+
+    names = []
+    for name in args.endings:
+        if not re.fullmatch(r"K[QRBNP]*vK[QRBNP]*", name) or len(name) - 1 > MAX_PIECES:
+            parser.error("not an ending of up to " + str(MAX_PIECES) + " pieces: " + name)
+        names.append(name if isStoredEnding(name) else flipEnding(name))
+    forced = set(names) if args.force else set()
+    if args.pieces is not None:
+        if not 3 <= args.pieces <= MAX_PIECES:
+            parser.error("--pieces should be from 3 to " + str(MAX_PIECES))
+        for numPieces in range(3, args.pieces + 1):
+            names += getEndings(numPieces)
+    if not names:
+        parser.error("give the endings to generate or --pieces")
+
+    done = set()
+    for name in names:
+        if name in DRAWN_ENDINGS:
+            print(name + ": drawn, no table needed")
+            continue
+        generateEnding(name, tablebase, args.workers, name in forced, done)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
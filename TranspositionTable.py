@@ -0,0 +1,139 @@
+"""
+Fixed size transposition table for the search, keyed by GameState.zobristKey. Entries are packed into two flat arrays of
+64 bit integers (key and data) so the memory used is fixed by the size given in megabytes.
+
+The table can live in shared memory so several search processes use the same entries. Each key word is stored xored
+with its data word, so an entry half written by one process while another reads it fails the key check and is ignored.
+"""
+
+from array import array
+from multiprocessing import shared_memory
+
+# bound types, 0 marks an empty slot
+EXACT = 1
+LOWER_BOUND = 2
+UPPER_BOUND = 3
+
+# replacement policies
+DEPTH_PREFERRED = "depth"
+ALWAYS_REPLACE = "always"
+
+# bytes per entry, one key word and one data word
+ENTRY_BYTES = 16
+
+# data word layout: move (16 bits) | bound (2 bits) | depth (8 bits) | score + SCORE_OFFSET (32 bits)
+SCORE_OFFSET = 1 << 31
+
+
+"""
+    Packs a move into 16 bits: start square, end square and the promotion piece type (0 when not a promotion), which is
+    the move's moveID
+"""
+
+
+def encodeMove(move):
+    if move is None:
+        return 0
+    return move.moveID
+
+
+"""
+    Returns the move in moves matching the packed move, or None
+"""
+
+
+def findMove(moves, moveCode):
+    if moveCode == 0:
+        return None
+    for move in moves:
+        if move.moveID == moveCode:
+            return move
+    return None
+
+
+"""
+    shared puts the table in a new block of shared memory, sharedName attaches to a block created by another process
+    with the same size and replacement policy. The process that created the block should unlink it when done
+"""
+
+
+class TranspositionTable():
+    def __init__(self, sizeMB=16, replacement=DEPTH_PREFERRED, shared=False, sharedName=None):
+        if replacement not in (DEPTH_PREFERRED, ALWAYS_REPLACE):
+            raise ValueError("Unknown replacement policy: " + str(replacement))
+        self.replacement = replacement
+        # depth preferred buckets hold a deepest slot and an always replaced slot
+        self.bucketSize = 2 if replacement == DEPTH_PREFERRED else 1
+        numEntries = max(self.bucketSize, int(sizeMB * 1024 * 1024) // ENTRY_BYTES)
+        self.numBuckets = numEntries // self.bucketSize
+        size = self.numBuckets * self.bucketSize
+        self.sharedMemory = None
+        if shared or sharedName is not None:
+            if sharedName is None:
+                self.sharedMemory = shared_memory.SharedMemory(create=True, size=ENTRY_BYTES * size)
+            else:
+                self.sharedMemory = shared_memory.SharedMemory(name=sharedName)
+            words = self.sharedMemory.buf.cast("Q")
+            self.keys = words[:size]
+            self.data = words[size:2 * size]
+        else:
+            self.keys = array("Q", bytes(8 * size))
+            self.data = array("Q", bytes(8 * size))
+
+    @property
+    def sharedName(self):
+        return self.sharedMemory.name if self.sharedMemory is not None else None
+
+    def clear(self):
+        if self.sharedMemory is not None:
+            self.sharedMemory.buf[:] = bytes(len(self.sharedMemory.buf))
+            return
+        size = len(self.keys)
+        self.keys = array("Q", bytes(8 * size))
+        self.data = array("Q", bytes(8 * size))
+
+    """
+        Detaches from the shared memory, unlink also frees it and should only be used by the process that created it
+    """
+
+    def close(self, unlink=False):
+        if self.sharedMemory is None:
+            return
+        self.keys.release()
+        self.data.release()
+        self.keys = self.data = None
+        self.sharedMemory.close()
+        if unlink:
+            self.sharedMemory.unlink()
+        self.sharedMemory = None
+
+    """
+        Returns (depth, score, bound, moveCode) for the position, or None if it is not stored
+    """
+
+    def probe(self, key):
+        index = (key % self.numBuckets) * self.bucketSize
+        for slot in range(index, index + self.bucketSize):
+            data = self.data[slot]
+            if data and self.keys[slot] ^ data == key:
+                return ((data >> 18) & 0xFF, (data >> 26) - SCORE_OFFSET, (data >> 16) & 0b11, data & 0xFFFF)
+        return None
+
+    def store(self, key, depth, score, bound, moveCode=0):
+        index = (key % self.numBuckets) * self.bucketSize
+        data = moveCode | (bound << 16) | (min(depth, 0xFF) << 18) | ((score + SCORE_OFFSET) << 26)
+        if self.bucketSize == 2:
+            stored = self.data[index]
+            # the first slot only gives way to the same position or an equal or deeper search
+            if self.keys[index] ^ stored != key and stored and depth < (stored >> 18) & 0xFF:
+                index += 1
+        self.keys[index] = key ^ data
+        self.data[index] = data
+
+    """
+        Permille of slots in use, sampled from the first thousand slots
+    """
+
+    def hashfull(self):
+        sample = min(1000, len(self.data))
+        return sum(1 for slot in range(sample) if self.data[slot]) * 1000 // sample
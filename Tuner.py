@@ -0,0 +1,268 @@
+"""
+Texel tuning of the evaluation weights. Fits the piece values and piece-square tables so a sigmoid of the evaluation
+predicts the results of the games the positions come from, and writes them to a weight file that Evaluate loads at
+startup (EvaluateState.WEIGHTS_FILE unless --output says otherwise).
+
+    python Tuner.py positions.epd
+    python Tuner.py positions.epd --epochs 200 --batch-size 16384 --output weights.json
+    python Tuner.py positions.epd --no-tables --start weights.json
+
+Each line holds a FEN or EPD position and the result of its game for white: 1-0, 0-1 or 1/2-1/2 (bare or as an EPD
+c9 "1-0"; operation) or a score in brackets such as [1.0], [0.5] or [0.0]. Quiet positions fit best, as the evaluation
+is taken without a search. The evaluation is linear in the weights, so each position is turned into a sparse feature
+vector once and every gradient step is a few NumPy array operations. Needs numpy.
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+from ChessEngine import *
+from EvaluateState import WEIGHTS_FILE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the piece types tuned, the king's value is left alone as both sides always have one
+TUNED_PIECES = [PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING]
+VALUE_PIECES = TUNED_PIECES[:-1]
+
+# weight vector layout: the piece values, then a 64 square table (white's point of view) for each piece type
+TABLES_START = len(VALUE_PIECES)
+NUM_WEIGHTS = TABLES_START + 64 * len(TUNED_PIECES)
+
+RESULTS = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}
+
+
+"""
+    Returns the game result (1 white won, 0.5 draw, 0 black won) given after a position, or None if there is none
+"""
+
+
+def parseResult(text):
+    for token in text.replace(";", " ").replace("\"", " ").split():
+        if token in RESULTS:
+            return RESULTS[token]
+        if token.startswith("[") and token.endswith("]"):
+            try:
+                result = float(token[1:-1])
+            except ValueError:
+                continue
+            if 0 <= result <= 1:
+                return result
+    return None
+
+
+"""
+    Reads the positions and their results, returns an (N, 64) int8 array of boards, the N results and the number of lines
+    skipped for having no result
+"""
+
+
+def readPositions(path):
+    boards = bytearray()
+    results = []
+    skipped = 0
+    for gs, rest in readFenFile(path):
+        result = parseResult(rest)
+        if result is None:
+            skipped += 1
+            continue
+        boards += bytes(chain.from_iterable(gs.board))
+        results.append(result)
+    return np.frombuffer(bytes(boards), dtype=np.int8).reshape(-1, 64), np.array(results), skipped
+
+
+"""
+    Turns the boards into sparse feature vectors, stored by row like a CSR matrix: the features of position i are
+    columns[starts[i]:starts[i + 1]] with values[starts[i]:starts[i + 1]]. Each white piece adds 1 to its piece value
+    and its table square, each black piece takes 1 off its piece value and the mirrored table square
+"""
+
+
+def extractFeatures(boards):
+    valueColumn = np.full(24, -1)
+    tableColumn = np.full((24, 64), -1)
+    for i, pieceType in enumerate(TUNED_PIECES):
+        for color in (WHITE, BLACK):
+            if pieceType in VALUE_PIECES:
+                valueColumn[color | pieceType] = i
+            for sq in range(64):
+                # black's tables are white's flipped top to bottom
+                tableColumn[color | pieceType][sq] = TABLES_START + 64 * i + (sq if color == WHITE else sq ^ 56)
+
+    rows, squares = np.nonzero(boards)
+    pieces = boards[rows, squares].astype(np.intp)
+    signs = np.where(pieces & WHITE, 1, -1).astype(np.int8)
+    hasValue = valueColumn[pieces] >= 0
+    rows = np.concatenate((rows, rows[hasValue]))
+    columns = np.concatenate((tableColumn[pieces, squares], valueColumn[pieces][hasValue])).astype(np.int16)
+    values = np.concatenate((signs, signs[hasValue]))
+    order = np.argsort(rows, kind="stable")
+    starts = np.searchsorted(rows[order], np.arange(len(boards) + 1))
+    return columns[order], values[order], starts
+
+
+def getWeights():
+    weights = np.zeros(NUM_WEIGHTS)
+    for i, pieceType in enumerate(VALUE_PIECES):
+        weights[i] = PIECE_VALUES[pieceType]
+    for i, pieceType in enumerate(TUNED_PIECES):
+        weights[TABLES_START + 64 * i:TABLES_START + 64 * (i + 1)] = np.ravel(PIECE_SQUARE_TABLES[pieceType])
+    return weights
+
+
+"""
+    Evaluations of positions first to last, from white's point of view
+"""
+
+
+def evaluate(features, weights, first, last):
+    columns, values, starts = features
+    start, end = starts[first], starts[last]
+    rows = np.repeat(np.arange(last - first), np.diff(starts[first:last + 1]))
+    return np.bincount(rows, weights=values[start:end] * weights[columns[start:end]], minlength=last - first)
+
+
+def sigmoid(evaluations, k):
+    return 1 / (1 + np.exp(-k * evaluations))
+
+
+def meanError(evaluations, results, k):
+    return float(np.mean((results - sigmoid(evaluations, k)) ** 2))
+
+
+"""
+    Finds the sigmoid scale that best fits the results to the evaluations with the starting weights, a golden section
+    search over the log of the scale
+"""
+
+
+def fitScale(evaluations, results, low=1e-4, high=1.0, iterations=40):
+    low, high = math.log(low), math.log(high)
+    ratio = (math.sqrt(5) - 1) / 2
+    for _ in range(iterations):
+        a = high - ratio * (high - low)
+        b = low + ratio * (high - low)
+        if meanError(evaluations, results, math.exp(a)) < meanError(evaluations, results, math.exp(b)):
+            high = b
+        else:
+            low = a
+    return math.exp((low + high) / 2)
+
+
+"""
+    Gradient of the mean squared error over positions first to last
+"""
+
+
+def gradient(features, weights, results, k, first, last):
+    columns, values, starts = features
+    start, end = starts[first], starts[last]
+    predictions = sigmoid(evaluate(features, weights, first, last), k)
+    # d error / d evaluation for each position
+    slopes = -2 * (results[first:last] - predictions) * predictions * (1 - predictions) * k / (last - first)
+    rows = np.repeat(np.arange(last - first), np.diff(starts[first:last + 1]))
+    return np.bincount(columns[start:end], weights=values[start:end] * slopes[rows], minlength=NUM_WEIGHTS)
+
+
+"""
+    Adam over mini batches of batchSize positions (all of them if 0). tuned masks the weights that may change
+"""
+
+
+def tune(features, results, weights, k, epochs, learningRate, batchSize, tuned, log=None):
+    numPositions = len(results)
+    batchSize = batchSize or numPositions
+    batches = [(first, min(first + batchSize, numPositions)) for first in range(0, numPositions, batchSize)]
+    rng = np.random.default_rng(0)
+    beta1, beta2, epsilon = 0.9, 0.999, 1e-8
+    moment = np.zeros(NUM_WEIGHTS)
+    variance = np.zeros(NUM_WEIGHTS)
+    step = 0
+    for epoch in range(1, epochs + 1):
+        for i in rng.permutation(len(batches)):
+            first, last = batches[i]
+            grad = gradient(features, weights, results, k, first, last) * tuned
+            step += 1
+            moment = beta1 * moment + (1 - beta1) * grad
+            variance = beta2 * variance + (1 - beta2) * grad ** 2
+            weights -= learningRate * (moment / (1 - beta1 ** step)) / (np.sqrt(variance / (1 - beta2 ** step)) + epsilon)
+        if log is not None:
+            log(epoch, weights)
+    return weights
+
+
+def roundWeights(weights):
+    pieceValues = dict(PIECE_VALUES)
+    for i, pieceType in enumerate(VALUE_PIECES):
+        pieceValues[pieceType] = int(round(weights[i]))
+    pieceSquareTables = {}
+    for i, pieceType in enumerate(TUNED_PIECES):
+        table = np.rint(weights[TABLES_START + 64 * i:TABLES_START + 64 * (i + 1)]).astype(int).reshape(8, 8)
+        pieceSquareTables[pieceType] = table.tolist()
+    return pieceValues, pieceSquareTables
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Texel tuning of the evaluation weights")
+    parser.add_argument("positions", help="file of FEN or EPD positions, each followed by its game result")
+    parser.add_argument("--output", default=WEIGHTS_FILE, help="weight file to write, by default the one Evaluate loads")
+    parser.add_argument("--start", help="weight file to start from instead of the built in weights")
+    parser.add_argument("--epochs", type=int, default=100, help="passes over the positions")
+    parser.add_argument("--learning-rate", dest="learningRate", type=float, default=0.5,
+                        help="Adam step size, in tenths of a pawn")
+    parser.add_argument("--batch-size", dest="batchSize", type=int, default=16384,
+                        help="positions per gradient step, 0 for all of them")
+    parser.add_argument("--k", type=float, help="sigmoid scale, fitted to the starting weights by default")
+    parser.add_argument("--no-tables", dest="tables", action="store_false", help="only tune the piece values")
+    parser.add_argument("--no-values", dest="values", action="store_false", help="only tune the piece-square tables")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        parser.error("the tuner needs numpy")
+    if args.epochs < 0 or args.batchSize < 0:
+        parser.error("epochs and batch size can not be negative")
+    if args.start:
+        loadWeights(args.start)
+
+    start = time.time()
+    boards, results, skipped = readPositions(args.positions)
+    if len(results) == 0:
+        parser.error("no positions with a result in " + args.positions)
+    # shuffled once so every mini batch is a mix of games
+    order = np.random.default_rng(0).permutation(len(results))
+    boards, results = boards[order], results[order]
+    features = extractFeatures(boards)
+    print("Loaded " + str(len(results)) + " positions (" + str(skipped) + " without a result skipped) in "
+          + str(round(time.time() - start, 2)) + " seconds")
+
+    weights = getWeights()
+    evaluations = evaluate(features, weights, 0, len(results))
+    k = args.k if args.k is not None else fitScale(evaluations, results)
+    print("K: " + str(round(k, 6)) + ", error " + str(round(meanError(evaluations, results, k), 6)))
+
+    tuned = np.zeros(NUM_WEIGHTS)
+    if args.values:
+        tuned[:TABLES_START] = 1
+    if args.tables:
+        tuned[TABLES_START:] = 1
+
+    def log(epoch, weights):
+        if epoch % 10 == 0 or epoch == args.epochs:
+            error = meanError(evaluate(features, weights, 0, len(results)), results, k)
+            print("Epoch " + str(epoch) + ", error " + str(round(error, 6)))
+
+    weights = tune(features, results, weights, k, args.epochs, args.learningRate, args.batchSize, tuned, log)
+    pieceValues, pieceSquareTables = roundWeights(weights)
+    saveWeights(args.output, pieceValues, pieceSquareTables)
+    print(json.dumps({PIECE_NAMES[pieceType]: pieceValues[pieceType] for pieceType in VALUE_PIECES}))
+    print("Wrote " + args.output + " in " + str(round(time.time() - start, 2)) + " seconds")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())